@@ -0,0 +1,74 @@
+"""Add composite index and uniqueness to energy_data
+
+Revision ID: 3c5e1f0a9b27
+Revises: 8d8b323fc0f8
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3c5e1f0a9b27"
+down_revision: Union[str, None] = "8d8b323fc0f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # The table used to be created by Base.metadata.create_all, so it may not exist yet
+    if not inspector.has_table("energy_data"):
+        op.create_table(
+            "energy_data",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("period", sa.DateTime(), nullable=False),
+            sa.Column("respondent", sa.String(), nullable=True),
+            sa.Column("respondent_name", sa.String(), nullable=True),
+            sa.Column("type", sa.String(), nullable=True),
+            sa.Column("type_name", sa.String(), nullable=True),
+            sa.Column("value", sa.Float(), nullable=True),
+            sa.Column("value_units", sa.String(), nullable=True),
+        )
+        inspector = sa.inspect(op.get_bind())
+
+    unique_constraints = {
+        constraint["name"]
+        for constraint in inspector.get_unique_constraints("energy_data")
+    }
+    indexes = {index["name"] for index in inspector.get_indexes("energy_data")}
+
+    if "uix_period_respondent_type" not in unique_constraints:
+        # Keep only the most recently inserted row of every duplicated period
+        op.execute(
+            """
+            DELETE FROM energy_data
+            WHERE id NOT IN (
+                SELECT MAX(id) FROM energy_data GROUP BY period, respondent, type
+            )
+            """
+        )
+
+        # SQLite cannot add a constraint in place, batch mode recreates the table
+        with op.batch_alter_table("energy_data") as batch_op:
+            batch_op.create_unique_constraint(
+                "uix_period_respondent_type", ["period", "respondent", "type"]
+            )
+
+    if "ix_energy_data_respondent_type_name_period" not in indexes:
+        op.create_index(
+            "ix_energy_data_respondent_type_name_period",
+            "energy_data",
+            ["respondent", "type_name", "period", "value"],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_energy_data_respondent_type_name_period", "energy_data")
+    with op.batch_alter_table("energy_data") as batch_op:
+        batch_op.drop_constraint("uix_period_respondent_type", type_="unique")
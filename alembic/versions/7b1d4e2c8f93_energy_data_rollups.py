@@ -0,0 +1,66 @@
+"""Add hourly, daily and monthly rollups of energy_data
+
+Revision ID: 7b1d4e2c8f93
+Revises: 3c5e1f0a9b27
+Create Date: 2026-10-18 11:02:57.640119
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7b1d4e2c8f93"
+down_revision: Union[str, None] = "3c5e1f0a9b27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Table name and bucket format (matching SQLAlchemy's DateTime storage format)
+ROLLUPS = {
+    "energy_data_hourly": "%Y-%m-%d %H:00:00.000000",
+    "energy_data_daily": "%Y-%m-%d 00:00:00.000000",
+    "energy_data_monthly": "%Y-%m-01 00:00:00.000000",
+}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    for table, bucket_format in ROLLUPS.items():
+        if not inspector.has_table(table):
+            op.create_table(
+                table,
+                sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+                sa.Column("bucket", sa.DateTime(), nullable=False),
+                sa.Column("respondent", sa.String(), nullable=False),
+                sa.Column("type_name", sa.String(), nullable=False),
+                sa.Column("value_sum", sa.Float(), nullable=False),
+                sa.Column("value_min", sa.Float(), nullable=False),
+                sa.Column("value_max", sa.Float(), nullable=False),
+                sa.Column("value_count", sa.Integer(), nullable=False),
+                sa.UniqueConstraint(
+                    "respondent", "type_name", "bucket", name=f"uix_{table}"
+                ),
+            )
+
+        # Backfill from the rows already stored
+        op.execute(f"DELETE FROM {table}")
+        op.execute(
+            f"""
+            INSERT INTO {table}
+                (bucket, respondent, type_name, value_sum, value_min, value_max, value_count)
+            SELECT strftime('{bucket_format}', period), respondent, type_name,
+                   SUM(value), MIN(value), MAX(value), COUNT(value)
+            FROM energy_data
+            WHERE respondent IS NOT NULL AND type_name IS NOT NULL AND value IS NOT NULL
+            GROUP BY strftime('{bucket_format}', period), respondent, type_name
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in ROLLUPS:
+        op.drop_table(table)
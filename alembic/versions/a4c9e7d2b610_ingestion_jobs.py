@@ -0,0 +1,49 @@
+"""Add ingestion_jobs for background, resumable seeding
+
+Revision ID: a4c9e7d2b610
+Revises: 7b1d4e2c8f93
+Create Date: 2026-10-18 14:26:03.517832
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c9e7d2b610"
+down_revision: Union[str, None] = "7b1d4e2c8f93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("ingestion_jobs"):
+        return
+
+    op.create_table(
+        "ingestion_jobs",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("params", sa.JSON(), nullable=False),
+        sa.Column("batch_size", sa.Integer(), nullable=True),
+        sa.Column("next_offset", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("pages", sa.Integer(), nullable=False),
+        sa.Column("rows", sa.Integer(), nullable=False),
+        sa.Column("elapsed_seconds", sa.Float(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_ingestion_jobs_status", "ingestion_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ingestion_jobs_status", "ingestion_jobs")
+    op.drop_table("ingestion_jobs")
@@ -0,0 +1,45 @@
+"""Add series_versions, the data version of every series
+
+Revision ID: b8e2f5a1d473
+Revises: f7a2c4e9d315
+Create Date: 2026-10-18 23:41:07.512930
+
+Ingestion moves the version of the series it writes in the same transaction
+as the rows, so every process can tell which series it holds in memory are
+out of date. Series already stored start at version 1.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8e2f5a1d473"
+down_revision: Union[str, None] = "f7a2c4e9d315"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("series_versions"):
+        return
+
+    op.create_table(
+        "series_versions",
+        sa.Column("respondent_id", sa.Integer(), primary_key=True),
+        sa.Column("type_id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    # Every stored series has rows in the monthly rollup
+    op.execute(
+        "INSERT INTO series_versions (respondent_id, type_id, version) "
+        "SELECT DISTINCT respondent_id, type_id, 1 FROM energy_data_monthly"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("series_versions")
@@ -0,0 +1,41 @@
+"""Add energy_data_partitions, the catalog of monthly energy_data tables
+
+Revision ID: c2f8a6d4e190
+Revises: a4c9e7d2b610
+Create Date: 2026-10-18 17:02:44.906215
+
+The partitions themselves are created by the application when rows of a new
+month are written, and rows already in energy_data are moved into them the
+first time the application opens the database.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c2f8a6d4e190"
+down_revision: Union[str, None] = "a4c9e7d2b610"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("energy_data_partitions"):
+        return
+
+    op.create_table(
+        "energy_data_partitions",
+        sa.Column("month", sa.DateTime(), primary_key=True),
+        sa.Column("table_name", sa.String(), nullable=False, unique=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("frozen_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("energy_data_partitions")
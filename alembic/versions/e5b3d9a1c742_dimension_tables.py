@@ -0,0 +1,233 @@
+"""Store respondent, type and unit strings in dimension tables
+
+Revision ID: e5b3d9a1c742
+Revises: c2f8a6d4e190
+Create Date: 2026-10-18 19:26:03.551870
+
+energy_data, every monthly partition and the rollups are rebuilt with integer
+ids in place of the strings they repeated on every row. Rows without a
+respondent or type cannot be referenced and are not copied. Rollup type names
+whose raw rows were dropped get a type with the name as its code.
+The old tables' pages are only returned to the OS by a VACUUM afterwards.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b3d9a1c742"
+down_revision: Union[str, None] = "c2f8a6d4e190"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIMENSIONS = ("respondents", "energy_types", "value_units")
+ROLLUPS = ("energy_data_hourly", "energy_data_daily", "energy_data_monthly")
+
+ROLLUP_COLUMNS = "value_sum, value_min, value_max, value_count"
+
+
+def fact_tables() -> list[str]:
+    """
+    energy_data and its monthly partitions
+    """
+    bind = op.get_bind()
+    tables = ["energy_data"]
+    if sa.inspect(bind).has_table("energy_data_partitions"):
+        result = bind.execute(
+            sa.text("SELECT table_name FROM energy_data_partitions ORDER BY month")
+        )
+        tables += result.scalars().all()
+    return tables
+
+
+def rebuild(table: str, definition: str, columns: str, rows: str, indexes: dict):
+    """
+    Replace a table by one created from definition and filled with rows
+    Triggers (on frozen partitions) are created again on the new table
+    """
+    bind = op.get_bind()
+    triggers = bind.execute(
+        sa.text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = :table"
+        ),
+        {"table": table},
+    )
+    triggers = triggers.scalars().all()
+
+    op.execute(f'CREATE TABLE "{table}__new" ({definition})')
+    op.execute(f'INSERT INTO "{table}__new" ({columns}) {rows}')
+    op.execute(f'DROP TABLE "{table}"')
+    op.execute(f'ALTER TABLE "{table}__new" RENAME TO "{table}"')
+    for name, index_columns in indexes.items():
+        op.execute(f'CREATE INDEX "{name}" ON "{table}" ({index_columns})')
+    for trigger in triggers:
+        op.execute(trigger)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("energy_data")}
+    if "respondent_id" in columns:
+        return
+
+    for table in DIMENSIONS:
+        if not inspector.has_table(table):
+            op.create_table(
+                table,
+                sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+                sa.Column("code", sa.String(), nullable=False, unique=True),
+                sa.Column("name", sa.String(), nullable=False),
+            )
+
+    facts = fact_tables()
+    rows = " UNION ALL ".join(f'SELECT * FROM "{table}"' for table in facts)
+    op.execute(
+        f"""
+        INSERT OR IGNORE INTO respondents (code, name)
+        SELECT respondent, MAX(COALESCE(respondent_name, respondent))
+        FROM ({rows}) WHERE respondent IS NOT NULL GROUP BY respondent
+        """
+    )
+    op.execute(
+        f"""
+        INSERT OR IGNORE INTO energy_types (code, name)
+        SELECT type, MAX(COALESCE(type_name, type))
+        FROM ({rows}) WHERE type IS NOT NULL GROUP BY type
+        """
+    )
+    op.execute(
+        f"""
+        INSERT OR IGNORE INTO value_units (code, name)
+        SELECT DISTINCT value_units, value_units
+        FROM ({rows}) WHERE value_units IS NOT NULL
+        """
+    )
+    for table in ROLLUPS:
+        op.execute(
+            f"""
+            INSERT OR IGNORE INTO respondents (code, name)
+            SELECT DISTINCT respondent, respondent FROM {table}
+            """
+        )
+        op.execute(
+            f"""
+            INSERT OR IGNORE INTO energy_types (code, name)
+            SELECT DISTINCT type_name, type_name FROM {table}
+            WHERE type_name NOT IN (SELECT name FROM energy_types)
+            """
+        )
+
+    for table in facts:
+        rebuild(
+            table,
+            """
+            id INTEGER NOT NULL PRIMARY KEY,
+            period DATETIME NOT NULL,
+            respondent_id INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            value FLOAT,
+            value_units_id INTEGER,
+            CONSTRAINT uix_period_respondent_type
+                UNIQUE (period, respondent_id, type_id)
+            """,
+            "id, period, respondent_id, type_id, value, value_units_id",
+            f"""
+            SELECT e.id, e.period, r.id, t.id, e.value, u.id
+            FROM "{table}" e
+            JOIN respondents r ON r.code = e.respondent
+            JOIN energy_types t ON t.code = e.type
+            LEFT JOIN value_units u ON u.code = e.value_units
+            """,
+            {
+                f"ix_{table}_respondent_id_type_id_period": (
+                    "respondent_id, type_id, period, value"
+                )
+            },
+        )
+
+    for table in ROLLUPS:
+        rebuild(
+            table,
+            f"""
+            id INTEGER NOT NULL PRIMARY KEY,
+            bucket DATETIME NOT NULL,
+            respondent_id INTEGER NOT NULL,
+            type_id INTEGER NOT NULL,
+            value_sum FLOAT NOT NULL,
+            value_min FLOAT NOT NULL,
+            value_max FLOAT NOT NULL,
+            value_count INTEGER NOT NULL,
+            CONSTRAINT uix_{table} UNIQUE (respondent_id, type_id, bucket)
+            """,
+            f"id, bucket, respondent_id, type_id, {ROLLUP_COLUMNS}",
+            f"""
+            SELECT b.id, b.bucket, r.id,
+                   (SELECT MIN(t.id) FROM energy_types t WHERE t.name = b.type_name),
+                   {ROLLUP_COLUMNS}
+            FROM {table} b
+            JOIN respondents r ON r.code = b.respondent
+            """,
+            {},
+        )
+
+
+def downgrade() -> None:
+    for table in fact_tables():
+        rebuild(
+            table,
+            """
+            id INTEGER NOT NULL PRIMARY KEY,
+            period DATETIME NOT NULL,
+            respondent VARCHAR,
+            respondent_name VARCHAR,
+            type VARCHAR,
+            type_name VARCHAR,
+            value FLOAT,
+            value_units VARCHAR,
+            CONSTRAINT uix_period_respondent_type UNIQUE (period, respondent, type)
+            """,
+            "id, period, respondent, respondent_name, type, type_name, value, value_units",
+            f"""
+            SELECT e.id, e.period, r.code, r.name, t.code, t.name, e.value, u.code
+            FROM "{table}" e
+            JOIN respondents r ON r.id = e.respondent_id
+            JOIN energy_types t ON t.id = e.type_id
+            LEFT JOIN value_units u ON u.id = e.value_units_id
+            """,
+            {
+                f"ix_{table}_respondent_type_name_period": (
+                    "respondent, type_name, period, value"
+                )
+            },
+        )
+
+    for table in ROLLUPS:
+        rebuild(
+            table,
+            f"""
+            id INTEGER NOT NULL PRIMARY KEY,
+            bucket DATETIME NOT NULL,
+            respondent VARCHAR NOT NULL,
+            type_name VARCHAR NOT NULL,
+            value_sum FLOAT NOT NULL,
+            value_min FLOAT NOT NULL,
+            value_max FLOAT NOT NULL,
+            value_count INTEGER NOT NULL,
+            CONSTRAINT uix_{table} UNIQUE (respondent, type_name, bucket)
+            """,
+            f"id, bucket, respondent, type_name, {ROLLUP_COLUMNS}",
+            f"""
+            SELECT b.id, b.bucket, r.code, t.name, {ROLLUP_COLUMNS}
+            FROM {table} b
+            JOIN respondents r ON r.id = b.respondent_id
+            JOIN energy_types t ON t.id = b.type_id
+            """,
+            {},
+        )
+
+    for table in DIMENSIONS:
+        op.drop_table(table)
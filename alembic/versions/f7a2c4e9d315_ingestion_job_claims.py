@@ -0,0 +1,51 @@
+"""Add the owner and checkpoint counts of ingestion jobs
+
+Revision ID: f7a2c4e9d315
+Revises: e5b3d9a1c742
+Create Date: 2026-10-18 21:12:40.318204
+
+Jobs are claimed by the process running them, and the pages and rows
+written below next_offset are kept apart from those past it, which a
+resumed job fetches again. Unfinished jobs keep their counts as their
+checkpoint counts.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f7a2c4e9d315"
+down_revision: Union[str, None] = "e5b3d9a1c742"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("ingestion_jobs")}
+    if "owner" in columns:
+        return
+
+    op.add_column(
+        "ingestion_jobs",
+        sa.Column("checkpoint_pages", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "ingestion_jobs",
+        sa.Column("checkpoint_rows", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("ingestion_jobs", sa.Column("owner", sa.String(), nullable=True))
+    op.execute(
+        "UPDATE ingestion_jobs SET checkpoint_pages = pages, checkpoint_rows = rows"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("ingestion_jobs") as batch:
+        batch.drop_column("owner")
+        batch.drop_column("checkpoint_rows")
+        batch.drop_column("checkpoint_pages")
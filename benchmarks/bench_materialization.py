@@ -0,0 +1,147 @@
+"""
+Rows/second of the stream_all materialization paths
+
+Compares the original path (ORM entity -> str dict -> EnergyData.model_validate)
+with the typed Core tuple paths used by EnergyDataService today.
+
+Usage: python -m benchmarks.bench_materialization [rows]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from energy_dashboard.database import (
+    Base,
+    EnergyDataTable,
+    EnergyTypeTable,
+    RespondentTable,
+    ValueUnitTable,
+)
+from energy_dashboard.dimensions import dimensions
+from energy_dashboard.models import EnergyData, StreamChartDataRequest
+from energy_dashboard.partitions import partitions
+from energy_dashboard.services import EnergyDataService
+
+ROW_COUNT = 10
+
+
+# The one series stored, as rows of the dimension tables
+DIMENSION_ROWS = {
+    RespondentTable: {
+        "id": 1,
+        "code": "MISO",
+        "name": "Midcontinent Independent System Operator, Inc.",
+    },
+    EnergyTypeTable: {"id": 1, "code": "D", "name": "Demand"},
+    ValueUnitTable: {"id": 1, "code": "megawatthours", "name": "megawatthours"},
+}
+
+
+def synthetic_rows(count: int) -> list[dict]:
+    start = datetime(2023, 1, 1)
+    return [
+        {
+            "period": start + timedelta(hours=i),
+            "respondent_id": 1,
+            "type_id": 1,
+            "value": 60000.0 + i % 50000,
+            "value_units_id": 1,
+        }
+        for i in range(count)
+    ]
+
+
+async def legacy_stream(session, chart_params: StreamChartDataRequest):
+    """
+    stream_all before the fast path: ORM entities turned into strings and
+    re-parsed, with the strings of the series joined from the dimension tables
+    """
+    dims = await dimensions.open(session)
+    start_date, end_date = EnergyDataService.parse_dates(chart_params)
+    stmt = (
+        select(EnergyDataTable, RespondentTable, EnergyTypeTable, ValueUnitTable)
+        .join(RespondentTable, RespondentTable.id == EnergyDataTable.respondent_id)
+        .join(EnergyTypeTable, EnergyTypeTable.id == EnergyDataTable.type_id)
+        .join(ValueUnitTable, ValueUnitTable.id == EnergyDataTable.value_units_id)
+        .where(EnergyDataService.chart_filter(chart_params, start_date, end_date, dims))
+        .order_by(EnergyDataTable.respondent_id, EnergyDataTable.period)
+        .execution_options(stream_results=True, max_row_buffer=ROW_COUNT)
+    )
+    results_stream = await session.stream(stmt)
+    async for partition in results_stream.partitions(ROW_COUNT):
+        buffer = []
+        for row, respondent, energy_type, units in partition:
+            row_dict = {
+                "id": str(row.id),
+                "period": str(row.period),
+                "respondent": str(respondent.code),
+                "respondent_name": str(respondent.name),
+                "type": str(energy_type.code),
+                "type_name": str(energy_type.name),
+                "value": str(row.value),
+                "value_units": str(units.name),
+            }
+            buffer.append(EnergyData.model_validate(row_dict))
+        yield buffer
+
+
+async def measure(name: str, stream, rows: int):
+    started = time.perf_counter()
+    count = 0
+    async for buffer in stream:
+        count += len(buffer)
+    elapsed = time.perf_counter() - started
+    assert count == rows, f"{name} returned {count} rows, expected {rows}"
+    print(f"{name:<28} {rows / elapsed:>12,.0f} rows/s  ({elapsed:.3f}s)")
+
+
+async def main(rows: int = 100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for table, row in DIMENSION_ROWS.items():
+                await conn.execute(insert(table), row)
+            await conn.execute(insert(EnergyDataTable), synthetic_rows(rows))
+
+        sessions = async_sessionmaker(bind=engine)
+        chart_params = StreamChartDataRequest(
+            respondents=["MISO"],
+            type_names=["Demand"],
+            start_date="2023-01-01",
+            end_date="2099-01-01",
+        )
+        print(f"Materializing {rows:,} rows")
+
+        async with sessions() as session:
+            await measure(
+                "legacy ORM + str + validate",
+                legacy_stream(session, chart_params),
+                rows,
+            )
+            # Move the rows into monthly partitions outside the timings
+            await partitions.open(session)
+        async with sessions() as session:
+            service = EnergyDataService(session, None)
+            await measure(
+                "stream_rows (Core tuples)", service.stream_rows(ROW_COUNT), rows
+            )
+        async with sessions() as session:
+            service = EnergyDataService(session, None)
+            await measure(
+                "stream_points (series, period, value)",
+                service.stream_points(chart_params, ROW_COUNT),
+                rows,
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,153 @@
+"""
+Records/second of EIA page parsing and bulk insert
+
+Parse: the original path (json.loads, then strptime and float() per record)
+against the columnar one used by fetch_data today (orjson, then period and
+value converted for the whole page by pandas).
+
+Insert: the original multi-row INSERT ... VALUES per batch, compiled again for
+every batch, against one upsert statement run with executemany, given dict
+rows through SQLAlchemy and positional tuples straight to the driver as
+insert_page does today.
+
+Usage: python -m benchmarks.bench_parse [pages] [page_length]
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import orjson
+
+# parse_page imports pandas on first use, loaded here so that is not timed
+import pandas  # noqa: F401
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks.synthetic import SyntheticDataset
+from energy_dashboard.database import Base, EnergyDataTable
+from energy_dashboard.dimensions import DimensionSet
+from energy_dashboard.services import (
+    INSERT_BATCH_SIZE,
+    UPSERT_COLUMNS,
+    EnergyDataService,
+)
+
+
+def legacy_parse_record(item: dict) -> dict:
+    """
+    Per-record parse used before the columnar path
+    """
+    return {
+        "value": float(item["value"]) if item["value"] is not None else 0.0,
+        "period": datetime.strptime(item["period"], "%Y-%m-%dT%H"),
+        "respondent": item["respondent"],
+        "respondent_name": item["respondent-name"],
+        "type": item["type"],
+        "type_name": item["type-name"],
+        "value_units": item["value-units"],
+    }
+
+
+def legacy_parse(body: bytes) -> list[dict]:
+    items = json.loads(body)["response"]["data"]
+    return [legacy_parse_record(item) for item in items]
+
+
+def columnar_parse(body: bytes) -> list:
+    items = orjson.loads(body)["response"]["data"]
+    return EnergyDataService.parse_page(items)["period"]
+
+
+def encoded_pages(bodies: list[bytes]) -> tuple[list[list[dict]], list[list[tuple]]]:
+    """
+    Pages as energy_data dict rows and parameter tuples, ids handed out to
+    their strings the way the dimension tables would
+    """
+    dims = DimensionSet()
+    records, rows = [], []
+    for body in bodies:
+        columns = EnergyDataService.parse_page(orjson.loads(body)["response"]["data"])
+        for dimension in dims.all:
+            for code, name in dimension.missing(columns).items():
+                dimension.add(len(dimension.values) + 1, code, name)
+        encoded = dims.encode(columns)
+        periods = encoded["period"].astype(datetime).tolist()
+        records.append(
+            [
+                dict(zip(UPSERT_COLUMNS, row))
+                for row in zip(periods, *(encoded[name] for name in UPSERT_COLUMNS[1:]))
+            ]
+        )
+        rows.append(EnergyDataService.upsert_rows(encoded))
+    return records, rows
+
+
+def legacy_upsert_stmt(records: list[dict]):
+    stmt = insert(EnergyDataTable).values(records)
+    return stmt.on_conflict_do_update(
+        index_elements=["period", "respondent_id", "type_id"],
+        set_={"value": stmt.excluded.value},
+    )
+
+
+def measure_parse(name: str, parse, bodies: list[bytes], rows: int):
+    started = time.perf_counter()
+    count = sum(len(parse(body)) for body in bodies)
+    elapsed = time.perf_counter() - started
+    assert count == rows, f"{name} parsed {count} records, expected {rows}"
+    print(f"{name:<34} {rows / elapsed:>12,.0f} records/s  ({elapsed:.3f}s)")
+
+
+async def measure_insert(name: str, insert_batch, pages: list[list], rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        started = time.perf_counter()
+        async with async_sessionmaker(bind=engine)() as session:
+            for records in pages:
+                for i in range(0, len(records), INSERT_BATCH_SIZE):
+                    await insert_batch(session, records[i : i + INSERT_BATCH_SIZE])
+                await session.commit()
+        elapsed = time.perf_counter() - started
+        await engine.dispose()
+    print(f"{name:<34} {rows / elapsed:>12,.0f} records/s  ({elapsed:.3f}s)")
+
+
+async def main(pages: int = 20, page_length: int = 5000):
+    dataset = SyntheticDataset.with_rows(pages * page_length)
+    bodies = [
+        orjson.dumps(dataset.page(page * page_length, page_length))
+        for page in range(pages)
+    ]
+    rows = min(pages * page_length, dataset.total)
+    print(f"{pages} pages of {page_length} records")
+
+    measure_parse("json + strptime per record", legacy_parse, bodies, rows)
+    measure_parse("orjson + columnar pandas", columnar_parse, bodies, rows)
+
+    records, tuples = encoded_pages(bodies)
+
+    async def multi_values(session, batch):
+        await session.execute(legacy_upsert_stmt(batch))
+
+    async def executemany(session, batch):
+        await session.execute(EnergyDataService.upsert_stmt(), batch)
+
+    async def driver_executemany(session, batch):
+        conn = await session.connection()
+        await conn.exec_driver_sql(EnergyDataService.upsert_sql(), batch)
+
+    await measure_insert("multi-row VALUES per batch", multi_values, records, rows)
+    await measure_insert("executemany upsert, dict rows", executemany, records, rows)
+    await measure_insert("executemany upsert, tuples", driver_executemany, tuples, rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
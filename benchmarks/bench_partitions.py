@@ -0,0 +1,125 @@
+"""
+Cost of a one week chart and of removing a month, single table against
+monthly partitions, as the stored history grows
+
+For every history length the same synthetic data is ingested through
+EnergyDataService.insert_page into a database with energy_data as one table
+and into one split by month. The week query runs through stream_points,
+bypassing the query cache and hot window; removing the oldest month is a
+DELETE on the single table and a DROP TABLE of its partition.
+
+Usage: python -m benchmarks.bench_partitions [respondents] [years...]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks.synthetic import SyntheticDataset
+from energy_dashboard.database import Base, EnergyDataTable, set_sqlite_pragmas
+from energy_dashboard.hot_window import hot_window
+from energy_dashboard.models import StreamChartDataRequest
+from energy_dashboard.partitions import next_month, partitions
+from energy_dashboard.services import INSERT_BATCH_SIZE, EnergyDataService
+
+PAGE_SIZE = 5000
+QUERY_RUNS = 20
+
+
+async def seed(sessions, dataset: SyntheticDataset) -> float:
+    started = time.perf_counter()
+    for offset in range(0, dataset.total, PAGE_SIZE):
+        async with sessions() as session:
+            await EnergyDataService(session, None).insert_page(
+                dataset.page(offset, PAGE_SIZE)["response"]["data"],
+                INSERT_BATCH_SIZE,
+            )
+    return time.perf_counter() - started
+
+
+async def week_query(sessions, dataset: SyntheticDataset) -> float:
+    # The last week of the history, the range dashboards look at most
+    end = dataset.end
+    chart_params = StreamChartDataRequest(
+        respondents=[dataset.respondent(0)],
+        type_names=["Demand"],
+        start_date=f"{end - timedelta(days=7):%Y-%m-%d}",
+        end_date=f"{end:%Y-%m-%d}",
+    )
+    latencies = []
+    for _ in range(QUERY_RUNS):
+        started = time.perf_counter()
+        async with sessions() as session:
+            service = EnergyDataService(session, None)
+            async for _ in service.stream_points(chart_params, 100):
+                pass
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies)
+
+
+async def remove_month(sessions, dataset: SyntheticDataset) -> float:
+    month = dataset.start
+    started = time.perf_counter()
+    async with sessions() as session:
+        if partitions.enabled:
+            await partitions.drop(session, month)
+        else:
+            table = EnergyDataTable.__table__
+            await session.execute(
+                delete(table).where(
+                    table.c.period >= month, table.c.period < next_month(month)
+                )
+            )
+            await session.commit()
+    return time.perf_counter() - started
+
+
+async def run(partitioned: bool, dataset: SyntheticDataset) -> dict:
+    partitions.enabled = partitioned
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+        seconds = await seed(sessions, dataset)
+        query = await week_query(sessions, dataset)
+        removal = await remove_month(sessions, dataset)
+        await engine.dispose()
+        size = os.path.getsize(path) / 2**20
+    return {
+        "ingest": dataset.total / seconds,
+        "query_ms": query * 1000,
+        "remove_ms": removal * 1000,
+        "size_mb": size,
+    }
+
+
+async def main(respondents: int = 5, *years: int):
+    # Only the database is measured, ingestion does not feed the hot window
+    hot_window.loaded = False
+    for length in years or (1, 4):
+        dataset = SyntheticDataset(respondents, length * 365 * 24)
+        print(f"{length} year(s), {dataset.total:,} rows")
+        for name, partitioned in (("single table", False), ("monthly", True)):
+            result = await run(partitioned, dataset)
+            print(
+                f"  {name:<14} ingest {result['ingest']:>8,.0f} rows/s  "
+                f"week query {result['query_ms']:>6.2f}ms  "
+                f"remove a month {result['remove_ms']:>8.1f}ms  "
+                f"file {result['size_mb']:>6.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,116 @@
+"""
+Chart query latency while ingestion writes to the same database
+
+Runs one writer upserting EIA pages through EnergyDataService.insert_page and
+several readers streaming a one week chart in a loop, first on plain SQLite
+connections (rollback journal) and then on connections tuned by
+set_sqlite_pragmas (WAL, synchronous=NORMAL, mmap and page cache).
+
+Usage: python -m benchmarks.bench_read_while_ingest [pages] [readers]
+"""
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from benchmarks.synthetic import SyntheticDataset
+from energy_dashboard.database import Base, set_sqlite_pragmas
+from energy_dashboard.models import StreamChartDataRequest
+from energy_dashboard.services import INSERT_BATCH_SIZE, EnergyDataService
+
+PAGE_SIZE = 5000
+# Demand of one respondent, PAGE_SIZE hours per page
+DATASET = SyntheticDataset(respondents=1, hours=1_000_000)
+
+
+def eia_page(page: int) -> list[dict]:
+    return DATASET.page(page * PAGE_SIZE, PAGE_SIZE)["response"]["data"]
+
+
+async def write(sessions, pages: int) -> float:
+    started = time.perf_counter()
+    for page in range(1, pages + 1):
+        async with sessions() as session:
+            await EnergyDataService(session, None).insert_page(
+                eia_page(page), INSERT_BATCH_SIZE
+            )
+    return time.perf_counter() - started
+
+
+async def read(sessions, writing: asyncio.Task, latencies: list, errors: list):
+    chart_params = StreamChartDataRequest(
+        respondents=[DATASET.respondent(0)],
+        type_names=["Demand"],
+        start_date="2023-01-01",
+        end_date="2023-01-08",
+    )
+    while not writing.done():
+        started = time.perf_counter()
+        try:
+            async with sessions() as session:
+                service = EnergyDataService(session, None)
+                async for _ in service.stream_points(chart_params, 100):
+                    pass
+        except Exception as exc:
+            errors.append(exc)
+            continue
+        latencies.append(time.perf_counter() - started)
+        # Let the writer in between queries, as separate requests would
+        await asyncio.sleep(0)
+
+
+async def run(name: str, tuned: bool, pages: int, readers: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}",
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=readers + 1,
+        )
+        if tuned:
+            event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+        # Give the readers something to read before the concurrent run
+        async with sessions() as session:
+            await EnergyDataService(session, None).insert_page(
+                eia_page(0), INSERT_BATCH_SIZE
+            )
+
+        latencies: list[float] = []
+        errors: list[Exception] = []
+        writing = asyncio.create_task(write(sessions, pages))
+        await asyncio.gather(
+            *(read(sessions, writing, latencies, errors) for _ in range(readers))
+        )
+        elapsed = writing.result()
+        await engine.dispose()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    print(
+        f"{name:<22} ingest {pages * PAGE_SIZE / elapsed:>9,.0f} rows/s  "
+        f"reads {len(latencies):>5}  "
+        f"p50 {statistics.median(latencies or [0]) * 1000:>7.1f}ms  "
+        f"p95 {p95 * 1000:>7.1f}ms  "
+        f"max {max(latencies or [0]) * 1000:>7.1f}ms  "
+        f"errors {len(errors)}"
+    )
+
+
+async def main(pages: int = 20, readers: int = 4):
+    print(f"{pages} pages of {PAGE_SIZE} rows, {readers} concurrent chart readers")
+    await run("rollback journal", False, pages, readers)
+    await run("WAL + tuned pragmas", True, pages, readers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,104 @@
+"""
+Import time of the app module and cold start time to the first `/` response
+
+Import: a fresh interpreter imports energy_dashboard.routes, and the heavy
+libraries it pulled in along the way are listed (Bokeh and pandas should not
+be there; they load in the render workers and on ingestion).
+
+Cold start: uvicorn is started on the app factory against an empty temporary
+database and `/` is polled until it answers, so the time covers interpreter
+start, imports, the lifespan (engine, schema, HTTP client, pools) and the
+first request.
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+HEAVY_MODULES = ("bokeh", "pandas", "numpy", "sqlalchemy", "fastapi", "aiosqlite")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import energy_dashboard.routes
+elapsed = time.perf_counter() - started
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def measure_cold_start(env: dict, timeout: float = 60.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "energy_dashboard.routes:create_app"]
+        + ["--factory", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0)
+                if response.status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before answering")
+            time.sleep(0.01)
+        raise TimeoutError(f"no response on / within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(runs: int = 5):
+    imports, starts = [], []
+    loaded = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}",
+                "PAGE_CACHE_DIR": "",
+                "SYNC_INTERVAL": "0",
+            }
+            probe = measure_import(env)
+            imports.append(probe["seconds"])
+            loaded = probe["loaded"]
+            starts.append(measure_cold_start(env))
+
+    print(f"import energy_dashboard.routes  median {statistics.median(imports):.3f}s")
+    print(f"  heavy modules loaded: {', '.join(loaded) or 'none'}")
+    print(f"cold start to first /          median {statistics.median(starts):.3f}s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
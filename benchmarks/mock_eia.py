@@ -0,0 +1,51 @@
+"""
+Local stand-in for the EIA region-data API, serving a SyntheticDataset
+
+In process, use mock_transport() with an httpx.AsyncClient. As a server:
+
+    python -m benchmarks.mock_eia [rows] [port]
+    EIA_BASE_URL=http://127.0.0.1:8001/v2 rye run dev
+"""
+
+import sys
+
+import httpx
+from fastapi import FastAPI, Query
+
+from benchmarks.synthetic import SyntheticDataset
+from energy_dashboard.utils import URLBuilder
+
+DEFAULT_LENGTH = 5000
+
+
+def mock_transport(dataset: SyntheticDataset) -> httpx.MockTransport:
+    """
+    Transport answering every region-data request from the data set
+    """
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if not request.url.path.endswith(URLBuilder.ROUTE):
+            return httpx.Response(404)
+        offset = int(request.url.params.get("offset", 0))
+        length = int(request.url.params.get("length", DEFAULT_LENGTH))
+        return httpx.Response(200, json=dataset.page(offset, length))
+
+    return httpx.MockTransport(handler)
+
+
+def create_app(dataset: SyntheticDataset) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v2" + URLBuilder.ROUTE)
+    async def region_data(offset: int = Query(0), length: int = Query(DEFAULT_LENGTH)):
+        return dataset.page(offset, length)
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8001
+    uvicorn.run(create_app(SyntheticDataset.with_rows(rows)), port=port)
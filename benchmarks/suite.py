@@ -0,0 +1,321 @@
+"""
+Seed throughput, chart query latency, time to first SSE chunk and peak memory
+at 10k, 1M and 10M rows
+
+Each size runs in a fresh interpreter with its own temporary database, seeded
+through EnergyDataService.fetch_data from the in-process mock EIA API, so runs
+are repeatable and never touch api.eia.gov. Results are written as JSON; pass
+a previous results file to --compare to print the change of every metric.
+
+Seeding is the slow part: expect minutes for 1M rows and much longer for 10M.
+
+Usage:
+    python -m benchmarks.suite [--sizes 10k,1m,10m] [--output results.json]
+                               [--compare previous.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.synthetic import TYPES, SyntheticDataset
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+PAGE_LENGTH = 5000
+QUERY_REPEATS = 5
+BUFFER_SIZE = 10
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def chart_queries(dataset: SyntheticDataset) -> dict[str, dict]:
+    """
+    /stream-chart query strings, by name
+    """
+
+    def day(dt: datetime) -> str:
+        return dt.strftime("%Y-%m-%d")
+
+    start = dataset.start
+    base = {"respondent": [dataset.respondent(0)], "type_name": ["Demand"]}
+    return {
+        "week_raw": {
+            **base,
+            "start_date": day(start),
+            "end_date": day(start + timedelta(days=7)),
+        },
+        "week_raw_compare": {
+            "respondent": [
+                dataset.respondent(i) for i in range(min(4, dataset.respondents))
+            ],
+            "type_name": [type_name for _, type_name in TYPES],
+            "start_date": day(start),
+            "end_date": day(start + timedelta(days=7)),
+        },
+        "month_raw": {
+            **base,
+            "start_date": day(start),
+            "end_date": day(start + timedelta(days=30)),
+        },
+        "full_range_max_points": {
+            **base,
+            "start_date": day(start),
+            "end_date": day(dataset.end + timedelta(days=1)),
+            "max_points": 1000,
+        },
+        "full_range_daily": {
+            **base,
+            "start_date": day(start),
+            "end_date": day(dataset.end + timedelta(days=1)),
+            "resolution": "day",
+        },
+    }
+
+
+def percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+
+async def bench_seed(dataset: SyntheticDataset) -> dict:
+    import httpx
+
+    from benchmarks.mock_eia import mock_transport
+    from energy_dashboard.database import AsyncSessionLocal
+    from energy_dashboard.services import EnergyDataService
+
+    async with (
+        httpx.AsyncClient(transport=mock_transport(dataset)) as client,
+        AsyncSessionLocal() as session,
+    ):
+        service = EnergyDataService(session, client)
+        summary = await service.fetch_data({"offset": 0, "length": PAGE_LENGTH})
+    return {**summary, "peak_rss_mb": peak_rss_mb()}
+
+
+async def bench_queries(dataset: SyntheticDataset) -> dict:
+    from energy_dashboard.cache import query_cache
+    from energy_dashboard.database import AsyncSessionLocal
+    from energy_dashboard.models import StreamChartDataRequest
+    from energy_dashboard.services import EnergyDataService
+
+    async def run(params: StreamChartDataRequest) -> tuple[float, int]:
+        started = time.perf_counter()
+        points = 0
+        async with AsyncSessionLocal() as session:
+            service = EnergyDataService(session, None)
+            async for buffer in service.stream_all(BUFFER_SIZE, params):
+                points += len(buffer)
+        return time.perf_counter() - started, points
+
+    results = {}
+    for name, fields in chart_queries(dataset).items():
+        fields = dict(fields)
+        params = StreamChartDataRequest(
+            respondents=fields.pop("respondent"),
+            type_names=fields.pop("type_name"),
+            **fields,
+        )
+        cold, warm = [], []
+        for _ in range(QUERY_REPEATS):
+            await query_cache.clear()
+            elapsed, points = await run(params)
+            cold.append(elapsed)
+            # The first run filled the cache
+            elapsed, _ = await run(params)
+            warm.append(elapsed)
+        results[name] = {
+            "points": points,
+            "cold": percentiles(cold),
+            "warm": percentiles(warm),
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+async def stream_sse(app, query: dict) -> dict:
+    """
+    Drive /stream-chart through ASGI and time its chunks
+    """
+    from urllib.parse import urlencode
+
+    started = time.perf_counter()
+    first_chunk = None
+    chunks = 0
+    finished = asyncio.Event()
+
+    async def receive():
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_chunk, chunks
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks += 1
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/stream-chart",
+        "root_path": "",
+        "query_string": urlencode(query, doseq=True).encode(),
+        "headers": [],
+        "server": ("benchmark", 80),
+        "client": ("benchmark", 0),
+        "app": app,
+    }
+    await app(scope, receive, send)
+    finished.set()
+    return {
+        "first_chunk_ms": round((first_chunk or 0.0) * 1000, 2),
+        "complete_ms": round((time.perf_counter() - started) * 1000, 2),
+        "chunks": chunks,
+    }
+
+
+async def bench_sse(dataset: SyntheticDataset) -> dict:
+    from energy_dashboard.cache import query_cache
+    from energy_dashboard.routes import app
+    from energy_dashboard.snapshots import chart_snapshots
+
+    query = {**chart_queries(dataset)["week_raw"], "pacing": "drain"}
+    results = {}
+    async with app.router.lifespan_context(app):
+        for mode in ("delta", "full"):
+            await query_cache.clear()
+            chart_snapshots.clear()
+            # The first stream also pays for starting the render workers
+            results[f"{mode}_cold"] = await stream_sse(app, {**query, "mode": mode})
+            chart_snapshots.clear()
+            results[mode] = await stream_sse(app, {**query, "mode": mode})
+        # The range is closed, so the finished chart is now a snapshot
+        results["snapshot"] = await stream_sse(app, {**query, "mode": "full"})
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+async def measure(rows: int) -> dict:
+    from energy_dashboard.database import dispose_db, init_db
+
+    dataset = SyntheticDataset.with_rows(rows)
+    await init_db()
+    results = {
+        "rows": dataset.total,
+        "respondents": dataset.respondents,
+        "hours": dataset.hours,
+        "seed": await bench_seed(dataset),
+        "queries": await bench_queries(dataset),
+        "sse": await bench_sse(dataset),
+    }
+    await dispose_db()
+    return results
+
+
+def run_size(name: str, rows: int) -> dict:
+    """
+    Measure one size in a child interpreter, so the database URL is set before
+    the app is imported and peak memory belongs to this size alone
+    """
+    print(f"[{name}] {rows:,} rows", flush=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = Path(tmp) / "result.json"
+        env = {
+            **os.environ,
+            "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}",
+            # Seeding is measured against the mock API, not replayed from disk
+            "PAGE_CACHE_DIR": "",
+        }
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--measure", str(rows)]
+            + ["--result", str(result_path)],
+            env=env,
+            check=True,
+        )
+        return json.loads(result_path.read_text())
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(previous: dict, current: dict):
+    before = flatten(previous["sizes"])
+    after = flatten(current["sizes"])
+    for metric in sorted(before.keys() & after.keys()):
+        old, new = before[metric], after[metric]
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"{metric:<60} {old:>14,.2f} {new:>14,.2f} {change:>9}")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=",".join(SIZES))
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare")
+    parser.add_argument("--measure", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        Path(args.result).write_text(json.dumps(asyncio.run(measure(args.measure))))
+        return
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    for name in args.sizes.split(","):
+        results["sizes"][name] = run_size(name, SIZES[name])
+        # Save after every size, a 10M run takes a while
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
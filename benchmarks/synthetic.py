@@ -0,0 +1,70 @@
+"""
+Deterministic EIA region-data records for any number of respondents and hours
+
+Records are computed from their position, so any page of a 10M row data set
+can be produced without holding the others in memory. The order matches what
+fetch_data pages through: respondent, then type, then hour.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+TYPES = [("D", "Demand"), ("NG", "Net generation")]
+
+
+@dataclass(frozen=True)
+class SyntheticDataset:
+    respondents: int
+    hours: int
+    start: datetime = datetime(2023, 1, 1)
+
+    @classmethod
+    def with_rows(
+        cls, rows: int, respondents: Optional[int] = None
+    ) -> "SyntheticDataset":
+        """
+        A data set of about `rows` records, with more respondents for larger sizes
+        """
+        if respondents is None:
+            respondents = max(1, min(50, rows // 100_000))
+        return cls(respondents, max(1, rows // (respondents * len(TYPES))))
+
+    @property
+    def total(self) -> int:
+        return self.respondents * len(TYPES) * self.hours
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(hours=self.hours - 1)
+
+    def respondent(self, index: int) -> str:
+        return f"R{index:03d}"
+
+    def record(self, position: int) -> dict:
+        respondent, rest = divmod(position, len(TYPES) * self.hours)
+        type_index, hour = divmod(rest, self.hours)
+        type_code, type_name = TYPES[type_index]
+        # Daily cycle plus a cheap, repeatable jitter
+        jitter = (position * 2654435761) % 5000
+        value = 80000 + 20000 * math.sin(2 * math.pi * hour / 24) + jitter
+        return {
+            "period": (self.start + timedelta(hours=hour)).strftime("%Y-%m-%dT%H"),
+            "respondent": self.respondent(respondent),
+            "respondent-name": f"Synthetic respondent {respondent}",
+            "type": type_code,
+            "type-name": type_name,
+            "value": str(round(value)),
+            "value-units": "megawatthours",
+        }
+
+    def page(self, offset: int, length: int) -> dict:
+        """
+        One EIA API response body
+        """
+        data = [
+            self.record(position)
+            for position in range(offset, min(offset + length, self.total))
+        ]
+        return {"response": {"total": str(self.total), "data": data}}
@@ -0,0 +1,84 @@
+"""
+Check that the /stream-chart query is answered from the composite index
+
+Runs EXPLAIN QUERY PLAN on the statement built by EnergyDataService.prepare_stmt
+and fails unless SQLite reads only the covering index of every partition it
+opens, in index order. Several respondents or types may be given comma
+separated, as compared on one chart; they have to be stored, the query of
+series without rows is not planned against the tables at all.
+
+Usage: python scripts/explain_chart_query.py [respondents] [type_names]
+"""
+
+import asyncio
+import sys
+
+from energy_dashboard.database import (
+    AsyncSessionLocal,
+    dispose_db,
+    get_engine,
+    init_db,
+)
+from energy_dashboard.dimensions import dimensions
+from energy_dashboard.models import StreamChartDataRequest
+from energy_dashboard.services import EnergyDataService
+
+# energy_data and each of its monthly partitions has its own copy of the index
+INDEX_SUFFIX = "_respondent_id_type_id_period"
+
+
+async def explain(stmt) -> list[str]:
+    # Expand the IN lists of the series into one placeholder per value
+    compiled = stmt.compile(
+        dialect=get_engine().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.construct_params()
+    values = tuple(str(params[name]) for name in compiled.positiontup)
+    async with get_engine().connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", values)
+        rows = result.all()
+    # Each row is (id, parent, notused, detail)
+    return [row[-1] for row in rows]
+
+
+async def main(respondents: str = "MISO,PJM", type_names: str = "Demand"):
+    params = StreamChartDataRequest(
+        respondents=respondents.split(","),
+        type_names=type_names.split(","),
+        start_date="2023-01-01",
+        end_date="2023-01-08",
+    )
+    names = [type_name.value for type_name in params.type_names]
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        dims = await dimensions.open(session, params.respondents, names)
+        stmt = await EnergyDataService.prepare_stmt(params, 10, session)
+    # Unknown strings have no ids, an empty IN list is planned as a constant
+    missing = [code for code in params.respondents if code not in dims.respondents.ids]
+    missing += [name for name in names if name not in dims.types.ids_by_name]
+    if missing:
+        print(f"Not stored: {', '.join(missing)}")
+    respondent_ids = dims.respondents.lookup(params.respondents)
+    if not respondent_ids or not dims.types.lookup_names(names):
+        await dispose_db()
+        sys.exit("No series of the query is stored, seed data before explaining it")
+    plan = await explain(stmt)
+    await dispose_db()
+    for detail in plan:
+        print(detail)
+
+    reads = [detail for detail in plan if detail.startswith(("SCAN", "SEARCH"))]
+    if any(INDEX_SUFFIX not in detail for detail in reads):
+        sys.exit(
+            f"Chart query reads a table without its *{INDEX_SUFFIX} index, "
+            "run `alembic upgrade head`"
+        )
+    if not all("COVERING INDEX" in d and INDEX_SUFFIX in d for d in reads):
+        sys.exit(f"Chart query is not covered by the *{INDEX_SUFFIX} indexes")
+    if any("TEMP B-TREE" in detail for detail in plan):
+        sys.exit("Chart query sorts rows outside the index")
+    print(f"OK: chart query is served by the *{INDEX_SUFFIX} index of each partition")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*sys.argv[1:]))
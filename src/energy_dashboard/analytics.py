@@ -0,0 +1,152 @@
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .dimensions import dimensions
+from .models import EnergyType, StreamChartDataRequest
+from .partitions import partition_select, partitions
+from .services import EnergyDataService
+
+# Percentiles reported for every series
+STATS_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+async def read_series(
+    session: AsyncSession,
+    respondent: str,
+    type_name: str,
+    start_date: datetime,
+    end_date: datetime,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (periods, values) of one series as arrays, from one range scan of the
+    composite index in every partition overlapping the range
+    Periods are read as the text SQLite stores and parsed by NumPy for the
+    whole series at once, instead of one datetime per row
+    """
+    catalog = await partitions.open(session)
+    dims = await dimensions.open(session, [respondent], [type_name])
+    respondent_ids = dims.respondents.lookup([respondent])
+    type_ids = dims.types.lookup_names([type_name])
+    result = await session.execute(
+        partition_select(
+            catalog.covering(start_date, end_date),
+            lambda table: select(
+                type_coerce(table.c.period, String).label("period"), table.c.value
+            ).where(
+                table.c.respondent_id.in_(respondent_ids),
+                table.c.type_id.in_(type_ids),
+                table.c.period >= start_date,
+                table.c.period <= end_date,
+            ),
+            "period",
+        )
+    )
+    rows = result.all()
+    if not rows:
+        return np.array([], dtype="datetime64[us]"), np.array([], dtype=float)
+    periods, values = zip(*rows)
+    return np.array(periods, dtype="datetime64[us]"), np.array(values, dtype=float)
+
+
+def point(periods: np.ndarray, values: np.ndarray, index: int) -> dict:
+    return {"period": periods[index].item(), "value": float(values[index])}
+
+
+def series_stats(
+    respondent: str, type_name: str, periods: np.ndarray, values: np.ndarray
+) -> dict:
+    """
+    Summary of one series, every figure a single vectorized pass
+    """
+    peak, trough = int(values.argmax()), int(values.argmin())
+    mean = float(values.mean())
+
+    # Mean value of each hour of the day, None for hours without data
+    hours = periods.astype("datetime64[h]").astype(np.int64) % 24
+    counts = np.bincount(hours, minlength=24)
+    sums = np.bincount(hours, weights=values, minlength=24)
+    profile = [
+        round(float(total / count), 3) if count else None
+        for total, count in zip(sums, counts)
+    ]
+
+    return {
+        "respondent": respondent,
+        "type_name": type_name,
+        "count": len(values),
+        "total": float(values.sum()),
+        "mean": round(mean, 3),
+        "std": round(float(values.std()), 3),
+        "min": float(values[trough]),
+        "max": float(values[peak]),
+        "peak": point(periods, values, peak),
+        "trough": point(periods, values, trough),
+        # Average over peak load, 1.0 for a perfectly flat series
+        "load_factor": round(mean / values[peak], 4) if values[peak] else None,
+        "percentiles": {
+            f"p{q}": float(value)
+            for q, value in zip(
+                STATS_PERCENTILES, np.percentile(values, STATS_PERCENTILES)
+            )
+        },
+        "hourly_profile": profile,
+    }
+
+
+def generation_gap(respondent: str, demand: tuple, generation: tuple) -> dict:
+    """
+    Net generation minus demand over the hours present in both series;
+    negative hours are covered by imports
+    """
+    _, demand_index, generation_index = np.intersect1d(
+        demand[0], generation[0], assume_unique=True, return_indices=True
+    )
+    periods = demand[0][demand_index]
+    gap = generation[1][generation_index] - demand[1][demand_index]
+    if not len(gap):
+        return {"respondent": respondent, "hours": 0}
+    return {
+        "respondent": respondent,
+        "hours": len(gap),
+        "mean": round(float(gap.mean()), 3),
+        "largest_deficit": point(periods, gap, int(gap.argmin())),
+        "largest_surplus": point(periods, gap, int(gap.argmax())),
+        "deficit_hours": int((gap < 0).sum()),
+    }
+
+
+async def range_stats(session: AsyncSession, params: StreamChartDataRequest) -> dict:
+    """
+    Statistics of every requested series over the range, and the generation
+    gap of respondents with both demand and net generation
+    """
+    start_date, end_date = EnergyDataService.parse_dates(params)
+    series = {}
+    for respondent, type_name in sorted(set(params.series)):
+        periods, values = await read_series(
+            session, respondent, type_name, start_date, end_date
+        )
+        if len(values):
+            series[(respondent, type_name)] = (periods, values)
+
+    demand, generation = EnergyType.D.value, EnergyType.NG.value
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "series": [
+            series_stats(respondent, type_name, periods, values)
+            for (respondent, type_name), (periods, values) in series.items()
+        ],
+        "generation_gaps": [
+            generation_gap(
+                respondent,
+                series[(respondent, demand)],
+                series[(respondent, generation)],
+            )
+            for respondent in sorted(set(params.respondents))
+            if (respondent, demand) in series and (respondent, generation) in series
+        ],
+    }
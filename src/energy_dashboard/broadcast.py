@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+from .metrics import BROADCAST_CHANNELS, SSE_CHUNK_BYTES, SSE_OPEN_STREAMS
+
+logger = logging.getLogger(__name__)
+
+# Chunks kept per channel so viewers joining a running stream can catch up
+BROADCAST_REPLAY_SIZE = int(os.getenv("BROADCAST_REPLAY_SIZE", "256"))
+# Chunks a viewer may fall behind the producer before it is disconnected
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "64"))
+
+
+class Subscriber:
+    """
+    A viewer's queue of chunks, and how many of them are not sent yet
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.pending = 0
+
+    def put(self, chunk: Optional[bytes]):
+        self.queue.put_nowait(chunk)
+        if chunk is not None:
+            self.pending += 1
+
+
+class Channel:
+    """
+    One running producer and the queues of everyone watching it
+    """
+
+    def __init__(
+        self,
+        key: str,
+        replay_size: int,
+        on_error: Optional[Callable[[], bytes]] = None,
+    ):
+        self.key = key
+        # Last chunk sent when the producer fails, so viewers stop listening
+        self.on_error = on_error
+        self.replay: deque[bytes] = deque(maxlen=replay_size)
+        # Set once the replay buffer no longer holds the start of the stream
+        self.truncated = False
+        self.finished = False
+        self.subscribers: set[Subscriber] = set()
+        self.task: Optional[asyncio.Task] = None
+        # Set whenever a viewer sends a chunk or leaves
+        self._progress = asyncio.Event()
+
+    @property
+    def joinable(self) -> bool:
+        return not self.finished and not self.truncated
+
+    def publish(self, chunk: Optional[bytes]):
+        if chunk is not None:
+            SSE_CHUNK_BYTES.observe(len(chunk))
+            if len(self.replay) == self.replay.maxlen:
+                self.truncated = True
+            self.replay.append(chunk)
+
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put(chunk)
+            except asyncio.QueueFull:
+                # Too slow to keep up, end this viewer's stream
+                logger.warning(f"Dropping lagging subscriber of {self.key}")
+                self.leave(subscriber)
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.put(None)
+
+    def sent(self, subscriber: Subscriber):
+        subscriber.pending -= 1
+        self._progress.set()
+
+    def leave(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        self._progress.set()
+
+    async def wait_drained(self) -> float:
+        """
+        Wait until every viewer has sent everything published so far
+        Returns the seconds waited
+        """
+        started = time.perf_counter()
+        while any(subscriber.pending for subscriber in self.subscribers):
+            self._progress.clear()
+            await self._progress.wait()
+        return time.perf_counter() - started
+
+
+class BroadcastHub:
+    """
+    Single-flight fan-out of rendered chunks
+    Concurrent subscribers with the same key share one producer, late joiners
+    first receive the chunks already produced from a bounded replay buffer
+    """
+
+    def __init__(self, replay_size: int, queue_size: int):
+        self.replay_size = replay_size
+        self.queue_size = queue_size
+        self._channels: dict[str, Channel] = {}
+
+    async def subscribe(
+        self,
+        key: str,
+        producer_factory: Callable[[Channel], AsyncIterator[bytes]],
+        on_error: Optional[Callable[[], bytes]] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream the chunks of the channel for key, starting
+        producer_factory(channel) if no joinable channel is running
+        When the producer raises, the chunk made by on_error ends the stream
+        """
+        channel = self._channels.get(key)
+        if channel is None or not channel.joinable:
+            # A truncated channel cannot replay the whole stream, so start a
+            # fresh producer; the old one keeps serving its own subscribers
+            channel = Channel(key, self.replay_size, on_error)
+            self._channels[key] = channel
+            channel.task = asyncio.create_task(
+                self._run(channel, producer_factory(channel))
+            )
+
+        # Replay and registration happen without awaiting, so no chunk is missed
+        subscriber = Subscriber(maxsize=self.replay_size + self.queue_size)
+        for chunk in channel.replay:
+            subscriber.put(chunk)
+        channel.subscribers.add(subscriber)
+
+        SSE_OPEN_STREAMS.inc()
+        try:
+            while (chunk := await subscriber.queue.get()) is not None:
+                yield chunk
+                channel.sent(subscriber)
+        finally:
+            SSE_OPEN_STREAMS.dec()
+            channel.leave(subscriber)
+            if not channel.subscribers and not channel.finished:
+                # Nobody is watching anymore
+                channel.task.cancel()
+
+    async def _run(self, channel: Channel, producer: AsyncIterator[bytes]):
+        try:
+            async for chunk in producer:
+                channel.publish(chunk)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception(f"Producer for {channel.key} failed")
+            if channel.on_error is not None:
+                channel.publish(channel.on_error())
+        finally:
+            channel.finished = True
+            channel.publish(None)
+            if self._channels.get(channel.key) is channel:
+                del self._channels[channel.key]
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._channels),
+            "subscribers": sum(
+                len(channel.subscribers) for channel in self._channels.values()
+            ),
+        }
+
+
+chart_hub = BroadcastHub(BROADCAST_REPLAY_SIZE, BROADCAST_QUEUE_SIZE)
+BROADCAST_CHANNELS.set_function(lambda: len(chart_hub._channels))
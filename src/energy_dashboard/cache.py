@@ -0,0 +1,279 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from aiocache import SimpleMemoryCache
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .database import EnergyTypeTable, RespondentTable, SeriesVersionTable
+from .models import StreamChartDataRequest
+
+# Number of query results kept, least recently used results are evicted first
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+# Seconds a query result stays valid when no ingestion touches it
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "300"))
+# Larger results are streamed without being cached
+QUERY_CACHE_MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", "50000"))
+# Rows kept over all results, about half a KiB each as ChartPoint objects
+QUERY_CACHE_MAX_TOTAL_ROWS = int(os.getenv("QUERY_CACHE_MAX_TOTAL_ROWS", "200000"))
+
+
+class CacheScope(NamedTuple):
+    """
+    The data a cached result was computed from
+    """
+
+    respondents: tuple[str, ...]
+    type_names: tuple[str, ...]
+    start: datetime
+    end: datetime
+
+    def overlaps(
+        self, respondent: str, type_name: str, start: datetime, end: datetime
+    ) -> bool:
+        """
+        Whether rows of the series written over [start, end] are in the scope
+        """
+        return (
+            respondent in self.respondents
+            and type_name in self.type_names
+            and self.start <= end
+            and start <= self.end
+        )
+
+
+# Range passed to invalidate() when which rows were written is not known
+ALL_PERIODS = (datetime.min, datetime.max)
+
+
+class SeriesVersions:
+    """
+    Data version of every series, shared by the in-memory tiers
+    Rows written by this process are passed to advance() with their period
+    range; sync() reads series_versions, which any process moves when it
+    writes rows, and has the tiers drop all they hold of a series another
+    process wrote to
+    """
+
+    def __init__(self):
+        self._versions: dict[tuple[str, str], int] = {}
+        # Sum of the versions seen, another sum stored means a series moved
+        self._total = 0
+        self._tiers = []
+        self._lock = asyncio.Lock()
+
+    def attach(self, tier):
+        """
+        Have tier.invalidate(respondent, type_name, start, end) awaited for
+        every series written
+        """
+        self._tiers.append(tier)
+
+    def versions(self, scope: CacheScope) -> tuple[int, ...]:
+        """
+        Data version of every series of the scope
+        """
+        return tuple(
+            self._versions.get((respondent, type_name), 0)
+            for respondent in scope.respondents
+            for type_name in scope.type_names
+        )
+
+    async def advance(
+        self,
+        respondent: str,
+        type_name: str,
+        version: int,
+        start: datetime,
+        end: datetime,
+    ):
+        """
+        Rows of the series written by this process over [start, end], in the
+        transaction that moved the series to version
+        """
+        if self._versions.get((respondent, type_name), 0) != version - 1:
+            # Another process wrote to the series too since it was last read
+            start, end = ALL_PERIODS
+        self._move(respondent, type_name, version)
+        await self._invalidate(respondent, type_name, start, end)
+
+    async def sync(self, engine: AsyncEngine):
+        """
+        Read the versions stored and invalidate the series that moved
+        Read on its own connection, so no older read transaction of a
+        session hides versions committed since
+        """
+        async with engine.connect() as conn:
+            total = await conn.scalar(
+                select(func.coalesce(func.sum(SeriesVersionTable.version), 0))
+            )
+            if total == self._total:
+                return
+            result = await conn.execute(
+                select(
+                    RespondentTable.code,
+                    EnergyTypeTable.name,
+                    SeriesVersionTable.version,
+                )
+                .join(
+                    RespondentTable,
+                    RespondentTable.id == SeriesVersionTable.respondent_id,
+                )
+                .join(EnergyTypeTable, EnergyTypeTable.id == SeriesVersionTable.type_id)
+            )
+            stored = result.all()
+
+        async with self._lock:
+            for respondent, type_name, version in stored:
+                if version > self._versions.get((respondent, type_name), 0):
+                    self._move(respondent, type_name, version)
+                    await self._invalidate(respondent, type_name, *ALL_PERIODS)
+
+    def _move(self, respondent: str, type_name: str, version: int):
+        seen = self._versions.get((respondent, type_name), 0)
+        if version > seen:
+            self._versions[(respondent, type_name)] = version
+            self._total += version - seen
+
+    async def _invalidate(
+        self, respondent: str, type_name: str, start: datetime, end: datetime
+    ):
+        for tier in self._tiers:
+            await tier.invalidate(respondent, type_name, start, end)
+
+
+class QueryResultCache:
+    """
+    LRU and TTL bounded cache of chart query results, stored in aiocache
+    Bounded by the number of results and by the rows they hold together, as
+    one result can be a few points or tens of thousands. Results are invalidated when any process writes rows inside their scope,
+    and a result read while its series were written to is not kept, see
+    SeriesVersions
+    """
+
+    def __init__(self, max_size: int, ttl: int, max_rows: int, max_total_rows: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.max_total_rows = max_total_rows
+        self._cache = SimpleMemoryCache(namespace="query")
+        # Cached keys in least to most recently used order
+        self._scopes: OrderedDict[str, CacheScope] = OrderedDict()
+        # When each cached key expires by the TTL
+        self._expires: dict[str, float] = {}
+        # Rows of each cached key, and their sum
+        self._rows: dict[str, int] = {}
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(params: StreamChartDataRequest, start: datetime, end: datetime) -> str:
+        """
+        Key of the normalized request: parsed dates, sorted series lists,
+        without presentation fields
+        """
+        fields = params.model_dump(
+            mode="json", exclude={"mode", "pacing", "chunk_size", "interval"}
+        )
+        fields["respondents"] = sorted(set(fields["respondents"]))
+        fields["type_names"] = sorted(set(fields["type_names"]))
+        fields["start_date"] = start.isoformat()
+        fields["end_date"] = end.isoformat()
+        return json.dumps(fields, sort_keys=True)
+
+    async def get(self, key: str) -> Optional[list]:
+        value = await self._cache.get(key)
+        if value is None:
+            self.misses += 1
+            self._forget(key)
+            return None
+        self.hits += 1
+        self._scopes.move_to_end(key)
+        return value
+
+    async def set(
+        self, key: str, scope: CacheScope, versions: tuple[int, ...], value: list
+    ):
+        """
+        Keep a result whose series are still at the versions it was read at
+        """
+        if len(value) > min(self.max_rows, self.max_total_rows):
+            return
+        if versions != series_versions.versions(scope):
+            return
+        self._prune()
+        self._forget(key)
+        await self._cache.set(key, value, ttl=self.ttl)
+        self._scopes[key] = scope
+        self._expires[key] = time.monotonic() + self.ttl
+        self._rows[key] = len(value)
+        self.rows += len(value)
+        while len(self._scopes) > self.max_size or self.rows > self.max_total_rows:
+            evicted = next(iter(self._scopes))
+            self._forget(evicted)
+            await self._cache.delete(evicted)
+            self.evictions += 1
+
+    def _forget(self, key: str):
+        self._scopes.pop(key, None)
+        self._expires.pop(key, None)
+        self.rows -= self._rows.pop(key, 0)
+
+    def _prune(self):
+        """
+        Forget the keys aiocache already expired by the TTL
+        """
+        now = time.monotonic()
+        for key in [key for key, expires in self._expires.items() if expires <= now]:
+            self._forget(key)
+
+    async def invalidate(
+        self, respondent: str, type_name: str, start: datetime, end: datetime
+    ):
+        """
+        Drop every result of the series whose range overlaps [start, end]
+        """
+        for key, scope in list(self._scopes.items()):
+            if scope.overlaps(respondent, type_name, start, end):
+                self._forget(key)
+                await self._cache.delete(key)
+                self.invalidations += 1
+
+    async def clear(self):
+        self._scopes.clear()
+        self._expires.clear()
+        self._rows.clear()
+        self.rows = 0
+        await self._cache.clear()
+
+    def stats(self) -> dict:
+        self._prune()
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._scopes),
+            "max_size": self.max_size,
+            "rows": self.rows,
+            "max_rows": self.max_total_rows,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+series_versions = SeriesVersions()
+
+query_cache = QueryResultCache(
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_MAX_ROWS, QUERY_CACHE_MAX_TOTAL_ROWS
+)
+series_versions.attach(query_cache)
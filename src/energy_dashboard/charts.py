@@ -0,0 +1,160 @@
+import math
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+# Bokeh and pandas are imported by the functions building figures, so only the
+# render workers load them; the app process only builds delta payloads
+if TYPE_CHECKING:
+    from bokeh.models import ColumnDataSource
+
+EPOCH = datetime(1970, 1, 1)
+
+# Names used by the browser to find the chart models when applying deltas
+CHART_FIGURE_NAME = "energy-chart"
+CHART_SOURCE_NAME = "energy-chart-source"
+
+
+def series_label(respondent: str, type_name: str) -> str:
+    return f"{respondent} {type_name}"
+
+
+def source_name(label: str) -> str:
+    return f"{CHART_SOURCE_NAME}:{label}"
+
+
+def chart_title(labels, hours) -> str:
+    latest = max(hours, default=None)
+    if latest is None:
+        return ", ".join(labels)
+    return f"{', '.join(labels)} - Hour: {latest}"
+
+
+def epoch_ms(hour: datetime) -> float:
+    # The unit Bokeh uses for datetime axes
+    return (hour - EPOCH).total_seconds() * 1000.0
+
+
+def prepare_data(label: str, hours, values) -> "ColumnDataSource":
+    from bokeh.models import ColumnDataSource
+
+    source = ColumnDataSource(
+        data=dict(hours=list(hours), values=list(values)), name=source_name(label)
+    )
+    return source
+
+
+def create_figure(title: str):
+    from bokeh.plotting import figure
+
+    fig = figure(
+        x_axis_type="datetime",
+        height=500,
+        tools="xpan",
+        width=1250,
+        title=title,
+        name=CHART_FIGURE_NAME,
+    )
+    return fig
+
+
+def format_figure(fig, start_date: str, end_date: str):
+    import pandas as pd
+    from bokeh.models import DatetimeTickFormatter, NumeralTickFormatter, Range1d
+
+    fig.title.align = "left"
+    fig.title.text_font_size = "1em"
+    fig.yaxis[0].formatter = NumeralTickFormatter(format="0.0a")
+    fig.yaxis.axis_label = "Megawatt Hours"
+    fig.xaxis.major_label_orientation = math.pi / 4
+
+    # Convert start_date and end_date from string to datetime
+    fig.x_range = Range1d(start=pd.Timestamp(start_date), end=pd.Timestamp(end_date))
+
+    fig.xaxis.ticker.desired_num_ticks = 24
+    fig.xaxis.formatter = DatetimeTickFormatter(
+        days="%m/%d/%Y, %H:%M:%S",  # Format for day-level ticks
+        hours="%m/%d/%Y, %H:%M:%S",  # Format for hour-level ticks
+    )
+    return fig
+
+
+def add_line_and_hover(fig, sources: dict[str, "ColumnDataSource"]):
+    from bokeh.models import HoverTool
+    from bokeh.palettes import Category10_10
+
+    for i, (label, source) in enumerate(sources.items()):
+        fig.line(
+            x="hours",
+            y="values",
+            source=source,
+            line_width=2,
+            color=Category10_10[i % len(Category10_10)],
+            legend_label=label,
+            name=label,
+        )
+    fig.legend.location = "top_left"
+    fig.legend.click_policy = "hide"
+    hover = HoverTool(
+        tooltips=[
+            ("Series", "$name"),
+            ("Value", "@values{0.00}"),
+            ("Hours", "@hours{%F %T}"),
+        ],
+        formatters={
+            "@hours": "datetime",
+        },
+        mode="vline",
+        show_arrow=False,
+    )
+    fig.add_tools(hover)
+    return fig
+
+
+def render_chart(series: dict, start_date: str, end_date: str, title: str):
+    """
+    Build the full line chart and return its (div, script) components
+    series: (hours, values) of every line to draw, by legend label
+    """
+    from bokeh.embed import components
+
+    sources = {
+        label: prepare_data(label, hours, values)
+        for label, (hours, values) in series.items()
+    }
+    fig = create_figure(title)
+    fig = format_figure(fig, start_date, end_date)
+    fig = add_line_and_hover(fig, sources)
+    script, div = components(fig)
+    return div, script
+
+
+def render_skeleton(labels, start_date: str, end_date: str):
+    """
+    Build the chart with one empty data source per line
+    Points are appended in the browser with ColumnDataSource.stream
+    """
+    return render_chart(
+        {label: ([], []) for label in labels},
+        start_date,
+        end_date,
+        title=chart_title(labels, [start_date]),
+    )
+
+
+def delta_payload(series: dict, title: str) -> dict:
+    """
+    Columnar payload of the new points of each line, applied in the browser
+    with ColumnDataSource.stream on the source of that line
+    Datetimes are sent as epoch milliseconds
+    """
+    return {
+        "figure": CHART_FIGURE_NAME,
+        "title": title,
+        "series": {
+            source_name(label): {
+                "hours": [epoch_ms(hour) for hour in hours],
+                "values": values,
+            }
+            for label, (hours, values) in series.items()
+        },
+    }
@@ -1,19 +1,49 @@
-from pathlib import Path
+import os
+from typing import Optional
 
-from databases import Database
-from sqlalchemy import Column, Integer, String, Float, DateTime, MetaData, create_engine
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    UniqueConstraint,
+    event,
+)
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from energy_dashboard.metrics import DB_POOL_CHECKED_OUT, DB_POOL_SIZE
 from energy_dashboard.utils import ROOT_DIR
 
 # Define the URL for the SQLite database
-ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{ROOT_DIR}/energy.db"
-DATABASE_URL = f"sqlite:///{ROOT_DIR}/energy.db"
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{ROOT_DIR}/energy.db"
+)
 
-# Create a Database instance using the DATABASE_URL
-database = Database(DATABASE_URL)
+# Connections kept open, and extra connections allowed under load
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+# Seconds to wait for a free connection before failing
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+# Log every statement
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "false").lower() == "true"
+
+# Bytes of the database file memory mapped by each connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection, negative values are in KiB
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+# Milliseconds a connection waits for a lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
 
 # Create a MetaData instance
 metadata = MetaData()
@@ -22,39 +52,217 @@ metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 
+# Distinct respondent, type and unit strings, stored once and referenced by id
+# from energy_data and the rollups
+class DimensionMixin:
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String, nullable=False, unique=True)
+    name = Column(String, nullable=False)
+
+
+class RespondentTable(DimensionMixin, Base):
+    __tablename__ = "respondents"
+
+
+class EnergyTypeTable(DimensionMixin, Base):
+    __tablename__ = "energy_types"
+
+
+# Units have no separate code, code and name are the same string
+class ValueUnitTable(DimensionMixin, Base):
+    __tablename__ = "value_units"
+
+
 # Define the EnergyData table
 class EnergyDataTable(Base):
     __tablename__ = "energy_data"
     id = Column(Integer, primary_key=True, autoincrement=True)
     period = Column(DateTime, nullable=False)
-    respondent = Column(String, nullable=True)
-    respondent_name = Column(String, nullable=True)
-    type = Column(String, nullable=True)
-    type_name = Column(String, nullable=True)
+    respondent_id = Column(Integer, nullable=False)
+    type_id = Column(Integer, nullable=False)
     value = Column(Float, nullable=True)
-    value_units = Column(String, nullable=True)
+    value_units_id = Column(Integer, nullable=True)
 
     __table_args__ = (
-        # UniqueConstraint(
-        #     "period", "respondent", "type", name="uix_period_respondent_type"
-        # ),
+        UniqueConstraint(
+            "period", "respondent_id", "type_id", name="uix_period_respondent_type"
+        ),
+        # Serves the chart queries: equality on respondent and type, range
+        # and ordering on period, with value included so no table lookup is needed
+        Index(
+            "ix_energy_data_respondent_id_type_id_period",
+            "respondent_id",
+            "type_id",
+            "period",
+            "value",
+        ),
     )
 
     def __repr__(self):
-        return f"<EnergyData(id={self.id}, period={self.period}, respondent={self.respondent}, respondent_name={self.respondent_name}, type={self.type}, type_name={self.type_name}, value={self.value}, value_units={self.value_units})>"
+        return f"<EnergyData(id={self.id}, period={self.period}, respondent_id={self.respondent_id}, type_id={self.type_id}, value={self.value}, value_units_id={self.value_units_id})>"
+
+
+# Tables holding one month of energy_data each, created on demand by
+# partitions.py; kept out of Base.metadata so create_all never makes them
+partition_metadata = MetaData()
+
+
+def energy_data_partition(name: str) -> Table:
+    """
+    A table with the columns, constraint and indexes of energy_data
+    """
+    table = partition_metadata.tables.get(name)
+    if table is None:
+        table = EnergyDataTable.__table__.to_metadata(partition_metadata, name=name)
+        # Index names are global to an SQLite database
+        for index in table.indexes:
+            index.name = index.name.replace(EnergyDataTable.__tablename__, name, 1)
+    return table
+
+
+# The monthly partitions of energy_data, month is the first hour of the month
+class EnergyDataPartitionTable(Base):
+    __tablename__ = "energy_data_partitions"
+    month = Column(DateTime, primary_key=True)
+    table_name = Column(String, nullable=False, unique=True)
+    created_at = Column(DateTime, nullable=False)
+    # Set once the partition is compacted and made read-only
+    frozen_at = Column(DateTime, nullable=True)
+
+
+# Pre-aggregated copies of energy_data, one row per (respondent, type, bucket)
+class RollupMixin:
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket = Column(DateTime, nullable=False)
+    respondent_id = Column(Integer, nullable=False)
+    type_id = Column(Integer, nullable=False)
+    value_sum = Column(Float, nullable=False)
+    value_min = Column(Float, nullable=False)
+    value_max = Column(Float, nullable=False)
+    value_count = Column(Integer, nullable=False)
 
 
-# Create an engine instance using the DATABASE_URL
+class HourlyRollupTable(RollupMixin, Base):
+    __tablename__ = "energy_data_hourly"
+    __table_args__ = (
+        UniqueConstraint(
+            "respondent_id", "type_id", "bucket", name="uix_energy_data_hourly"
+        ),
+    )
+
+
+class DailyRollupTable(RollupMixin, Base):
+    __tablename__ = "energy_data_daily"
+    __table_args__ = (
+        UniqueConstraint(
+            "respondent_id", "type_id", "bucket", name="uix_energy_data_daily"
+        ),
+    )
+
+
+class MonthlyRollupTable(RollupMixin, Base):
+    __tablename__ = "energy_data_monthly"
+    __table_args__ = (
+        UniqueConstraint(
+            "respondent_id", "type_id", "bucket", name="uix_energy_data_monthly"
+        ),
+    )
+
 
-## Async engine for async queries (https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html)
-async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=True)
+# Data version of every (respondent, type), moved in the transaction writing
+# its rows, so processes holding the series in memory notice other writers
+class SeriesVersionTable(Base):
+    __tablename__ = "series_versions"
+    respondent_id = Column(Integer, primary_key=True)
+    type_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+
+# Background seed runs, with the page offset to resume from
+class IngestionJobTable(Base):
+    __tablename__ = "ingestion_jobs"
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False, index=True)
+    params = Column(JSON, nullable=False)
+    batch_size = Column(Integer, nullable=True)
+    next_offset = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=True)
+    pages = Column(Integer, nullable=False, default=0)
+    rows = Column(Integer, nullable=False, default=0)
+    # Pages and rows below next_offset, where a resumed attempt starts counting
+    checkpoint_pages = Column(Integer, nullable=False, default=0)
+    checkpoint_rows = Column(Integer, nullable=False, default=0)
+    # Process running the job, it keeps the job while it checkpoints
+    owner = Column(String, nullable=True)
+    # Seconds spent running, summed over every attempt
+    elapsed_seconds = Column(Float, nullable=False, default=0.0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection
+    WAL lets readers run while the ingest writer commits, and with WAL
+    synchronous=NORMAL only syncs at checkpoints
+    """
+    cursor = dbapi_connection.cursor()
+    # Pages freed by dropping a partition can be given back to the OS without
+    # a VACUUM of the whole file; only takes effect on a new database
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+## Async engine shared by the whole app (https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html)
+## Created on first use, normally by init_db at startup, so importing the
+## models never opens a database client
+async_engine: Optional[AsyncEngine] = None
+
+# Sessions only check out a connection when they run their first statement,
+# they are bound to the engine when it is created
 AsyncSessionLocal = async_sessionmaker(
-    autocommit=False, autoflush=False, bind=async_engine
+    autocommit=False, autoflush=False, expire_on_commit=False
 )
 
-## Sync engine for sync queries
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create the tables defined in the metadata
-Base.metadata.create_all(engine)
+def get_engine() -> AsyncEngine:
+    global async_engine
+    if async_engine is None:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            echo=DATABASE_ECHO,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=DATABASE_POOL_SIZE,
+            max_overflow=DATABASE_MAX_OVERFLOW,
+            pool_timeout=DATABASE_POOL_TIMEOUT,
+        )
+        if async_engine.dialect.name == "sqlite":
+            event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+        DB_POOL_SIZE.set_function(async_engine.pool.size)
+        DB_POOL_CHECKED_OUT.set_function(async_engine.pool.checkedout)
+        AsyncSessionLocal.configure(bind=async_engine)
+    return async_engine
+
+
+async def init_db():
+    """
+    Create the engine and the tables defined in the metadata
+    """
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def dispose_db():
+    """
+    Close the pooled connections, the engine reconnects if used again
+    """
+    if async_engine is not None:
+        await async_engine.dispose()
@@ -0,0 +1,258 @@
+import asyncio
+import sys
+import weakref
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import EnergyTypeTable, RespondentTable, ValueUnitTable
+from .models import EnergyData
+
+
+class Dimension:
+    """
+    One dimension table held in memory: ids by code and by name, and the
+    (code, name) of every id
+    Strings are interned, so every row decoded shares the same objects
+    """
+
+    def __init__(self, table, code_column: str, name_column: str):
+        self.table = table
+        # EIA column lists (see parse_page) the codes and names are read from
+        self.code_column = code_column
+        self.name_column = name_column
+        self.ids: dict[str, int] = {}
+        self.ids_by_name: dict[str, int] = {}
+        self.values: dict[int, tuple[str, str]] = {}
+
+    def add(self, id: int, code: str, name: str):
+        code, name = sys.intern(code), sys.intern(name)
+        if id in self.values:
+            # A renamed code is no longer found by its old name
+            old_name = self.values[id][1]
+            if old_name != name and self.ids_by_name.get(old_name) == id:
+                del self.ids_by_name[old_name]
+        self.ids[code] = id
+        self.ids_by_name[name] = id
+        self.values[id] = (code, name)
+
+    def code(self, id: int) -> str:
+        return self.values[id][0]
+
+    def name(self, id: int) -> str:
+        return self.values[id][1]
+
+    def lookup(self, codes: Iterable[str]) -> list[int]:
+        """
+        Ids of the codes stored, unknown codes have no rows to match
+        """
+        return [self.ids[code] for code in codes if code in self.ids]
+
+    def lookup_names(self, names: Iterable[str]) -> list[int]:
+        return [self.ids_by_name[name] for name in names if name in self.ids_by_name]
+
+    def missing(self, columns: dict[str, list]) -> dict[str, str]:
+        """
+        Codes and names of a page that are not stored yet, or renamed
+        """
+        names = dict(zip(columns[self.code_column], columns[self.name_column]))
+        names.pop(None, None)
+        return {
+            code: name
+            for code, name in names.items()
+            if code not in self.ids or self.name(self.ids[code]) != name
+        }
+
+
+class DimensionSet:
+    """
+    The respondent, type and unit dimensions of one database
+    """
+
+    def __init__(self):
+        self.respondents = Dimension(RespondentTable, "respondent", "respondent_name")
+        self.types = Dimension(EnergyTypeTable, "type", "type_name")
+        self.units = Dimension(ValueUnitTable, "value_units", "value_units")
+
+    @property
+    def all(self) -> tuple[Dimension, ...]:
+        return self.respondents, self.types, self.units
+
+    def encode(self, columns: dict[str, list]) -> dict[str, list]:
+        """
+        EIA column lists as energy_data column lists
+        """
+        respondents, types, units = self.respondents.ids, self.types.ids, self.units.ids
+        return {
+            "period": columns["period"],
+            "respondent_id": [respondents[code] for code in columns["respondent"]],
+            "type_id": [types[code] for code in columns["type"]],
+            "value": columns["value"],
+            "value_units_id": [units.get(unit) for unit in columns["value_units"]],
+        }
+
+    def series(self, respondent_id: int, type_id: int) -> tuple[str, str]:
+        """
+        (respondent, type_name) of a series
+        """
+        return self.respondents.code(respondent_id), self.types.name(type_id)
+
+    def order(self, series: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
+        """
+        Distinct (respondent, type_name) pairs in the order of their ids, the
+        order chart queries return series in; unknown strings sort last
+        """
+        respondents, types = self.respondents.ids, self.types.ids_by_name
+        return sorted(
+            set(series),
+            key=lambda pair: (
+                respondents.get(pair[0], sys.maxsize),
+                types.get(pair[1], sys.maxsize),
+                pair,
+            ),
+        )
+
+    def columns(self, rows) -> dict[str, list]:
+        """
+        EnergyData column lists of energy_data rows
+        """
+        respondents = [self.respondents.values[row.respondent_id] for row in rows]
+        types = [self.types.values[row.type_id] for row in rows]
+        units = [self.units.values.get(row.value_units_id) for row in rows]
+        return {
+            "id": [row.id for row in rows],
+            "period": [row.period for row in rows],
+            "respondent": [code for code, _ in respondents],
+            "respondent_name": [name for _, name in respondents],
+            "type": [code for code, _ in types],
+            "type_name": [name for _, name in types],
+            "value": [row.value for row in rows],
+            "value_units": [unit[1] if unit else None for unit in units],
+        }
+
+    def energy_data(self, row) -> EnergyData:
+        """
+        EnergyData of an energy_data row, with its strings looked up
+        """
+        respondent, respondent_name = self.respondents.values[row.respondent_id]
+        type_code, type_name = self.types.values[row.type_id]
+        units = self.units.values.get(row.value_units_id)
+        return EnergyData.model_construct(
+            id=row.id,
+            period=row.period,
+            respondent=respondent,
+            respondent_name=respondent_name,
+            type=type_code,
+            type_name=type_name,
+            value=row.value,
+            value_units=units[1] if units else None,
+        )
+
+
+class EnergyDimensions:
+    """
+    Dictionary encoding of the strings repeated on every energy_data row
+    Each database's dimension tables are kept in memory, so ingestion and
+    queries translate between strings and ids without a join; codes not seen
+    before are added when a page containing them is written, and read again
+    when a query asks for strings another process may have added
+    """
+
+    def __init__(self):
+        self._sets: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = asyncio.Lock()
+
+    async def open(
+        self,
+        session: AsyncSession,
+        respondents: Iterable[str] = (),
+        type_names: Iterable[str] = (),
+    ) -> DimensionSet:
+        """
+        Dimensions of the database the session is bound to
+        Respondent codes and type names not known yet are read again first,
+        so lookups find the ones stored by another process since
+        """
+        engine = session.bind
+        dimensions = self._sets.get(engine.sync_engine)
+        if dimensions is None:
+            async with self._lock:
+                dimensions = self._sets.get(engine.sync_engine)
+                if dimensions is None:
+                    dimensions = DimensionSet()
+                    async with engine.connect() as conn:
+                        for dimension in dimensions.all:
+                            await self._read(conn, dimension)
+                    self._sets[engine.sync_engine] = dimensions
+
+        codes = [code for code in respondents if code not in dimensions.respondents.ids]
+        names = [
+            name for name in type_names if name not in dimensions.types.ids_by_name
+        ]
+        if codes or names:
+            async with engine.connect() as conn:
+                if codes:
+                    await self._read(conn, dimensions.respondents, codes=codes)
+                if names:
+                    await self._read(conn, dimensions.types, names=names)
+        return dimensions
+
+    async def refresh(self, session: AsyncSession) -> DimensionSet:
+        """
+        Dimensions with every table read again, for reads decoding the ids of
+        every series stored, including those added by another process
+        """
+        dimensions = await self.open(session)
+        async with session.bind.connect() as conn:
+            for dimension in dimensions.all:
+                await self._read(conn, dimension)
+        return dimensions
+
+    @staticmethod
+    async def _read(
+        conn,
+        dimension: Dimension,
+        codes: Optional[list[str]] = None,
+        names: Optional[list[str]] = None,
+    ):
+        table = dimension.table
+        stmt = select(table.id, table.code, table.name)
+        if codes is not None:
+            stmt = stmt.where(table.code.in_(codes))
+        if names is not None:
+            stmt = stmt.where(table.name.in_(names))
+        result = await conn.execute(stmt)
+        for id, code, name in result.all():
+            dimension.add(id, code, name)
+
+    async def intern(self, session: AsyncSession, columns: dict[str, list]):
+        """
+        Dimensions holding every string of a page of EIA column lists, the
+        missing ones added in their own transaction
+        Names of stored codes are updated, as EIA renames respondents
+        """
+        dimensions = await self.open(session)
+        missing = [
+            (dimension, dimension.missing(columns)) for dimension in dimensions.all
+        ]
+        if not any(names for _, names in missing):
+            return dimensions
+
+        async with self._lock, session.bind.begin() as conn:
+            for dimension, names in missing:
+                if not names:
+                    continue
+                stmt = insert(dimension.table)
+                await conn.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["code"], set_={"name": stmt.excluded.name}
+                    ),
+                    [{"code": code, "name": name} for code, name in names.items()],
+                )
+                await self._read(conn, dimension, list(names))
+        return dimensions
+
+
+dimensions = EnergyDimensions()
@@ -0,0 +1,75 @@
+import numpy as np
+
+from energy_dashboard.models import DownsampleMethod
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+    Returns the indices of the n_out points that best preserve the shape of the line
+    x: ascending float array, y: values
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # First and last points are always kept, the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average point of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def min_max(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Per-bucket min/max downsampling
+    Returns the indices of the lowest and highest point of n_out / 2 equal-width
+    time buckets, in time order, so every peak and trough survives
+    x: ascending float array, y: values
+    """
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    n_buckets = n_out // 2
+    span = x[-1] - x[0] or 1.0
+    buckets = np.minimum(((x - x[0]) / span * n_buckets).astype(np.intp), n_buckets - 1)
+
+    # Sort by (bucket, value): the first row of each bucket is its min, the last its max
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    firsts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    lasts = np.r_[firsts[1:] - 1, n - 1]
+
+    return np.unique(np.concatenate([order[firsts], order[lasts]]))
+
+
+def downsample(
+    x: np.ndarray, y: np.ndarray, max_points: int, method: DownsampleMethod
+) -> np.ndarray:
+    """
+    Return the indices of at most max_points points to draw
+    """
+    if method == DownsampleMethod.MIN_MAX:
+        return min_max(x, y, max_points)
+    return lttb(x, y, max_points)
@@ -0,0 +1,131 @@
+import importlib.util
+import os
+from typing import AsyncIterator
+
+import orjson
+
+from .models import ExportFormat
+
+# Rows per NDJSON chunk, Arrow record batch or Parquet row group
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def available(format: ExportFormat) -> bool:
+    """
+    Arrow and Parquet need pyarrow, installed with the export extra
+    """
+    return format == ExportFormat.NDJSON or bool(importlib.util.find_spec("pyarrow"))
+
+
+class ChunkSink:
+    """
+    Write-only file handing out what was written since the last take()
+    The position keeps counting, Parquet records offsets from it
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("period", pa.timestamp("us")),
+            ("respondent", pa.string()),
+            ("respondent_name", pa.string()),
+            ("type", pa.string()),
+            ("type_name", pa.string()),
+            ("value", pa.float64()),
+            ("value_units", pa.string()),
+        ]
+    )
+
+
+async def ndjson_chunks(
+    batches: AsyncIterator[dict[str, list]],
+) -> AsyncIterator[bytes]:
+    async for columns in batches:
+        names = list(columns)
+        yield b"".join(
+            orjson.dumps(dict(zip(names, row)), option=orjson.OPT_APPEND_NEWLINE)
+            for row in zip(*columns.values())
+        )
+
+
+async def arrow_chunks(
+    batches: AsyncIterator[dict[str, list]],
+) -> AsyncIterator[bytes]:
+    """
+    An Arrow IPC stream, one record batch per batch of rows
+    """
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for columns in batches:
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+async def parquet_chunks(
+    batches: AsyncIterator[dict[str, list]],
+) -> AsyncIterator[bytes]:
+    """
+    A Parquet file, one row group per batch of rows; the footer comes last
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        async for columns in batches:
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+WRITERS = {
+    ExportFormat.NDJSON: ndjson_chunks,
+    ExportFormat.ARROW: arrow_chunks,
+    ExportFormat.PARQUET: parquet_chunks,
+}
+
+
+def encode(
+    format: ExportFormat, batches: AsyncIterator[dict[str, list]]
+) -> AsyncIterator[bytes]:
+    return WRITERS[format](batches)
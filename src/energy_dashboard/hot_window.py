@@ -0,0 +1,218 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func, select
+
+from .cache import ALL_PERIODS, series_versions
+from .database import AsyncSessionLocal, MonthlyRollupTable
+from .dimensions import dimensions
+from .partitions import partition_select, partitions
+
+logger = logging.getLogger(__name__)
+
+# Days of the most recent data kept in memory per series, 0 disables the window
+HOT_WINDOW_DAYS = int(os.getenv("HOT_WINDOW_DAYS", "7"))
+
+
+def epoch_hour(dt: datetime, ceil: bool = False) -> int:
+    """
+    Hours since the epoch of dt, rounded down or up to a whole hour
+    """
+    hour = int(np.datetime64(dt, "h").astype(np.int64))
+    if ceil and dt > datetime(1970, 1, 1) + timedelta(hours=hour):
+        hour += 1
+    return hour
+
+
+class SeriesRing:
+    """
+    The last `capacity` hours of one series in two NumPy arrays
+    Hour h lives in slot h % capacity, so a write or a time slice is index
+    arithmetic; a slot holding another hour than the one asked for is a gap
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hours = np.full(capacity, -1, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.latest = -1
+
+    @property
+    def first(self) -> int:
+        # Oldest hour the ring holds whenever it was stored
+        return self.latest - self.capacity + 1
+
+    def write(self, hours: np.ndarray, values: np.ndarray):
+        self.latest = max(self.latest, int(hours.max()))
+        # Hours older than the window would overwrite newer ones
+        keep = hours >= self.first
+        slots = hours[keep] % self.capacity
+        self.hours[slots] = hours[keep]
+        self.values[slots] = values[keep]
+
+    def slice(self, start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (hours, values) stored in [start, end], in time order
+        """
+        wanted = np.arange(start, min(end, self.latest) + 1, dtype=np.int64)
+        slots = wanted % self.capacity
+        found = self.hours[slots] == wanted
+        return wanted[found], self.values[slots[found]]
+
+
+class HotWindow:
+    """
+    In-memory tier holding the most recent days of every series
+    Loaded at startup and kept current by ingestion, it answers raw chart
+    queries that fall inside the window without touching the database;
+    series another process wrote to are read again, see SeriesVersions
+    """
+
+    def __init__(self, days: int):
+        self.capacity = days * 24
+        self.loaded = False
+        self._series: dict[tuple[str, str], SeriesRing] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """
+        Read the window of every series, one index range scan per series
+        """
+        if not self.capacity:
+            return
+        self.loaded = False
+        self._series.clear()
+        async with AsyncSessionLocal() as session:
+            # Taken first, series written by another process meanwhile are
+            # read again on the next sync
+            await series_versions.sync(session.bind)
+            await self._read(session, await dimensions.refresh(session))
+        self.loaded = True
+        logger.info(
+            f"Hot window holds the last {self.capacity}h of {len(self._series)} series"
+        )
+
+    async def invalidate(
+        self, respondent: str, type_name: str, start: datetime, end: datetime
+    ):
+        """
+        Read a series again when another process wrote to it, rows written
+        by this process are applied by write()
+        """
+        if not self.loaded or (start, end) != ALL_PERIODS:
+            return
+        # Until read again, queries of the series go to the database
+        self._series.pop((respondent, type_name), None)
+        async with AsyncSessionLocal() as session:
+            dims = await dimensions.open(session, [respondent], [type_name])
+            await self._read(
+                session,
+                dims,
+                MonthlyRollupTable.respondent_id.in_(
+                    dims.respondents.lookup([respondent])
+                ),
+                MonthlyRollupTable.type_id.in_(dims.types.lookup_names([type_name])),
+            )
+
+    async def _read(self, session, dims, *where):
+        """
+        Read the window of the series matching the monthly rollup filters
+        """
+        catalog = await partitions.open(session)
+        # The monthly rollup narrows each series to its last month
+        series = await session.execute(
+            select(
+                MonthlyRollupTable.respondent_id,
+                MonthlyRollupTable.type_id,
+                func.max(MonthlyRollupTable.bucket),
+            )
+            .where(*where)
+            .group_by(MonthlyRollupTable.respondent_id, MonthlyRollupTable.type_id)
+        )
+        for respondent_id, type_id, last_month in series.all():
+            start = last_month - timedelta(hours=self.capacity)
+            result = await session.execute(
+                partition_select(
+                    catalog.covering(start),
+                    lambda table: select(table.c.period, table.c.value).where(
+                        table.c.respondent_id == respondent_id,
+                        table.c.type_id == type_id,
+                        table.c.period >= start,
+                    ),
+                    "period",
+                )
+            )
+            rows = result.all()
+            if rows:
+                periods, values = zip(*rows)
+                self._write(*dims.series(respondent_id, type_id), periods, values)
+
+    def write(self, columns: dict[str, list]):
+        """
+        Apply the rows of an ingested page, as EnergyData column lists
+        Applied while loading too, the rows may be newer than those read
+        """
+        if not self.capacity:
+            return
+        rows = defaultdict(list)
+        for i, key in enumerate(zip(columns["respondent"], columns["type_name"])):
+            rows[key].append(i)
+        periods = np.asarray(columns["period"])
+        values = np.asarray(columns["value"], dtype=np.float64)
+        for (respondent, type_name), index in rows.items():
+            self._write(respondent, type_name, periods[index], values[index])
+
+    def _write(self, respondent: str, type_name: str, periods, values):
+        ring = self._series.get((respondent, type_name))
+        if ring is None:
+            ring = self._series[(respondent, type_name)] = SeriesRing(self.capacity)
+        hours = np.array(periods, dtype="datetime64[h]").astype(np.int64)
+        ring.write(hours, np.asarray(values, dtype=np.float64))
+
+    def select(
+        self, series: list[tuple[str, str]], start_date: datetime, end_date: datetime
+    ) -> Optional[list[tuple[str, str, np.ndarray, np.ndarray]]]:
+        """
+        (respondent, type_name, periods, values) of every series over the
+        range in the order given, or None when the range reaches outside the
+        window of any series
+        """
+        if not self.loaded:
+            return None
+        start, end = epoch_hour(start_date, ceil=True), epoch_hour(end_date)
+        keys = list(dict.fromkeys(series))
+        rings = [self._series.get(key) for key in keys]
+        if any(ring is None or start < ring.first for ring in rings):
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        results = []
+        for (respondent, type_name), ring in zip(keys, rings):
+            hours, values = ring.slice(start, end)
+            periods = hours.astype("datetime64[h]").astype("datetime64[us]")
+            results.append((respondent, type_name, periods, values))
+        return results
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hours": self.capacity,
+            "loaded": self.loaded,
+            "series": len(self._series),
+            "bytes": sum(
+                ring.hours.nbytes + ring.values.nbytes for ring in self._series.values()
+            ),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+hot_window = HotWindow(HOT_WINDOW_DAYS)
+series_versions.attach(hot_window)
@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from sqlalchemy import and_, or_, select, update
+
+from .database import AsyncSessionLocal, IngestionJobTable, get_engine
+from .models import IngestionJobStatus
+from .services import EnergyDataService
+
+logger = logging.getLogger(__name__)
+
+# Seed jobs running at the same time, further jobs wait in the queue
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Seconds a running job may go without a checkpoint before another process
+# takes it to be orphaned (its worker crashed) and runs it
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+
+class JobLeaseLost(Exception):
+    """
+    Another process took over a job this process was running
+    """
+
+
+class IngestionJobRunner:
+    """
+    Runs seed requests as background jobs on a bounded pool of workers
+    Every job stores the offset below which all pages are written, so jobs
+    interrupted by a crash or restart resume from there on the next start.
+    Each process (uvicorn worker) claims a job with one conditional UPDATE
+    before running it, so a job runs in one process at a time
+    """
+
+    def __init__(self, workers: int, lease: int):
+        self.workers = workers
+        self.lease = timedelta(seconds=lease)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self, client: httpx.AsyncClient):
+        self._client = client
+        # Re-queue the jobs a previous process did not finish, oldest first;
+        # every process does, the claim leaves each job to one of them
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestionJobTable.id)
+                .where(
+                    IngestionJobTable.status.in_(
+                        [IngestionJobStatus.QUEUED, IngestionJobStatus.RUNNING]
+                    )
+                )
+                .order_by(IngestionJobTable.created_at)
+            )
+            for job_id in result.scalars():
+                logger.info(f"Resuming ingestion job {job_id}")
+                self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs this process was running go back to the queue, the next
+        # process to start resumes them from their checkpoint
+        async with get_engine().begin() as conn:
+            await conn.execute(
+                update(IngestionJobTable)
+                .where(
+                    IngestionJobTable.owner == self.owner,
+                    IngestionJobTable.status == IngestionJobStatus.RUNNING,
+                )
+                .values(status=IngestionJobStatus.QUEUED, owner=None)
+            )
+
+    async def submit(self, params: dict, batch_size: Optional[int] = None) -> dict:
+        params = dict(params)
+        job = IngestionJobTable(
+            id=uuid.uuid4().hex,
+            status=IngestionJobStatus.QUEUED,
+            params=params,
+            batch_size=batch_size,
+            next_offset=int(params.pop("offset", 0)),
+            pages=0,
+            rows=0,
+            checkpoint_pages=0,
+            checkpoint_rows=0,
+            elapsed_seconds=0.0,
+            created_at=datetime.now(),
+        )
+        async with AsyncSessionLocal() as session:
+            session.add(job)
+            await session.commit()
+        self._queue.put_nowait(job.id)
+        return self.describe(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        async with AsyncSessionLocal() as session:
+            job = await session.get(IngestionJobTable, job_id)
+        return self.describe(job) if job else None
+
+    async def resume(self, job_id: str) -> Optional[dict]:
+        """
+        Queue a failed job again, it continues from its checkpoint
+        """
+        async with AsyncSessionLocal() as session:
+            job = await session.get(IngestionJobTable, job_id)
+        if job is None:
+            return None
+        if job.status == IngestionJobStatus.FAILED:
+            await self._update(
+                job_id, status=IngestionJobStatus.QUEUED, owner=None, error=None
+            )
+            self._queue.put_nowait(job_id)
+        return await self.get(job_id)
+
+    async def recent(self, limit: int = 50) -> list[dict]:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestionJobTable)
+                .order_by(IngestionJobTable.created_at.desc())
+                .limit(limit)
+            )
+            return [self.describe(job) for job in result.scalars()]
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except JobLeaseLost:
+                logger.warning(f"Ingestion job {job_id} was taken over, stopping")
+            except Exception:
+                logger.exception(f"Ingestion job {job_id} failed")
+
+    async def _claim(self, job_id: str) -> Optional[IngestionJobTable]:
+        """
+        Take a queued or orphaned job for this process
+        None when the job is finished or another process is running it; the
+        job is queued again for when that process' lease could have expired
+        """
+        now = datetime.now()
+        async with get_engine().begin() as conn:
+            result = await conn.execute(
+                update(IngestionJobTable)
+                .where(
+                    IngestionJobTable.id == job_id,
+                    or_(
+                        IngestionJobTable.status == IngestionJobStatus.QUEUED,
+                        and_(
+                            IngestionJobTable.status == IngestionJobStatus.RUNNING,
+                            or_(
+                                IngestionJobTable.updated_at.is_(None),
+                                IngestionJobTable.updated_at < now - self.lease,
+                            ),
+                        ),
+                    ),
+                )
+                .values(
+                    status=IngestionJobStatus.RUNNING,
+                    owner=self.owner,
+                    started_at=now,
+                    updated_at=now,
+                )
+            )
+        async with AsyncSessionLocal() as session:
+            job = await session.get(IngestionJobTable, job_id)
+        if result.rowcount == 1:
+            return job
+
+        if job and job.status == IngestionJobStatus.RUNNING and job.owner != self.owner:
+            retry = (job.updated_at + self.lease - now).total_seconds() + 1
+            asyncio.get_running_loop().call_later(
+                max(retry, 1), self._queue.put_nowait, job_id
+            )
+        return None
+
+    async def run(self, job_id: str):
+        job = await self._claim(job_id)
+        if job is None:
+            return
+
+        # Pages, rows and time below the checkpoint of earlier attempts, this
+        # run continues from them; pages past it are fetched and counted again
+        base_rows, base_pages = job.checkpoint_rows, job.checkpoint_pages
+        base_elapsed = job.elapsed_seconds
+        started = time.perf_counter()
+
+        async def checkpoint(
+            offset: int,
+            total: int,
+            pages: int,
+            rows: int,
+            checkpoint_pages: int,
+            checkpoint_rows: int,
+        ):
+            await self._save(
+                job_id,
+                next_offset=offset,
+                total=total,
+                pages=base_pages + pages,
+                rows=base_rows + rows,
+                checkpoint_pages=base_pages + checkpoint_pages,
+                checkpoint_rows=base_rows + checkpoint_rows,
+                elapsed_seconds=base_elapsed + time.perf_counter() - started,
+            )
+
+        params = {**job.params, "offset": job.next_offset}
+        try:
+            async with AsyncSessionLocal() as session:
+                service = EnergyDataService(session, self._client)
+                if job.batch_size:
+                    await service.fetch_data(
+                        params, batch_size=job.batch_size, checkpoint=checkpoint
+                    )
+                else:
+                    await service.fetch_data(params, checkpoint=checkpoint)
+        except (asyncio.CancelledError, JobLeaseLost):
+            raise
+        except Exception as exc:
+            await self._save(
+                job_id,
+                status=IngestionJobStatus.FAILED,
+                error=f"{type(exc).__name__}: {exc}",
+                finished_at=datetime.now(),
+            )
+            raise
+        await self._save(
+            job_id,
+            status=IngestionJobStatus.COMPLETED,
+            elapsed_seconds=base_elapsed + time.perf_counter() - started,
+            finished_at=datetime.now(),
+        )
+
+    async def _save(self, job_id: str, **values):
+        """
+        Update a job this process runs, which also renews its lease
+        Raises JobLeaseLost when another process has taken the job over
+        """
+        async with get_engine().begin() as conn:
+            result = await conn.execute(
+                update(IngestionJobTable)
+                .where(
+                    IngestionJobTable.id == job_id,
+                    IngestionJobTable.owner == self.owner,
+                )
+                .values(updated_at=datetime.now(), **values)
+            )
+        if result.rowcount != 1:
+            raise JobLeaseLost(job_id)
+
+    @staticmethod
+    async def _update(job_id: str, **values):
+        async with get_engine().begin() as conn:
+            await conn.execute(
+                update(IngestionJobTable)
+                .where(IngestionJobTable.id == job_id)
+                .values(updated_at=datetime.now(), **values)
+            )
+
+    @staticmethod
+    def describe(job: IngestionJobTable) -> dict:
+        elapsed = job.elapsed_seconds or 0.0
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "params": job.params,
+            "batch_size": job.batch_size,
+            "offset": job.next_offset,
+            "total": job.total,
+            "pages": job.pages,
+            "rows": job.rows,
+            "progress": (
+                round(min(job.next_offset / job.total, 1.0), 3) if job.total else None
+            ),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(job.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "error": job.error,
+            "owner": job.owner,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "updated_at": job.updated_at,
+            "finished_at": job.finished_at,
+        }
+
+
+ingestion_jobs = IngestionJobRunner(INGEST_WORKERS, JOB_LEASE_SECONDS)
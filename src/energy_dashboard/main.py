@@ -1,5 +1,16 @@
 import uvicorn
 
+
+def main():
+    # Run the app using uvicorn, the factory builds it in the server process
+    uvicorn.run(
+        "energy_dashboard.routes:create_app",
+        factory=True,
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+    )
+
+
 if __name__ == "__main__":
-    # Run the app using uvicorn
-    uvicorn.run("energy_dashboard.routes:app", host="0.0.0.0", port=8000, reload=True)
+    main()
@@ -0,0 +1,186 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# Upper bounds of the size buckets, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class MetricsRegistry:
+    """
+    Metrics exposed on /metrics in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+        registry.register(self)
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    """
+    A value that goes up and down, or is read from function at scrape time
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        registry.register(self)
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def samples(self) -> list[str]:
+        value = self.function() if self.function else self.value
+        return [f"{self.name} {value}"]
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets; observe() is a bisect and three
+    additions, cheap enough for per-chunk hot paths
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # One extra slot for observations above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        registry.register(self)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+# Ingestion
+EIA_REQUEST_SECONDS = Histogram(
+    "eia_request_seconds", "Latency of EIA API page requests"
+)
+EIA_PARSE_SECONDS = Histogram(
+    "eia_parse_seconds", "Time to decode the JSON of one EIA page"
+)
+INSERT_BATCH_SECONDS = Histogram(
+    "insert_batch_seconds", "Time to upsert one batch of rows"
+)
+ROLLUP_REFRESH_SECONDS = Histogram(
+    "rollup_refresh_seconds", "Time to refresh the rollups after one page"
+)
+ROWS_INGESTED = Counter("rows_ingested_total", "Rows written by ingestion")
+EIA_PAGE_CACHE_HITS = Counter(
+    "eia_page_cache_hits_total", "EIA pages read from the on-disk page cache"
+)
+EIA_PAGE_CACHE_MISSES = Counter(
+    "eia_page_cache_misses_total", "EIA pages not found in the on-disk page cache"
+)
+
+# Chart queries
+QUERY_FIRST_ROW_SECONDS = Histogram(
+    "query_first_row_seconds", "Time from issuing a query to its first rows"
+)
+ROW_MATERIALIZE_SECONDS = Histogram(
+    "row_materialize_seconds", "Time to turn one fetched partition into models"
+)
+CHART_RENDER_SECONDS = Histogram(
+    "chart_render_seconds", "Time to render a Bokeh chart in the render pool"
+)
+
+# Streaming
+SSE_CHUNK_BYTES = Histogram(
+    "sse_chunk_bytes", "Size of the chunks sent to SSE clients", SIZE_BUCKETS
+)
+SSE_OPEN_STREAMS = Gauge("sse_open_streams", "SSE responses currently open")
+
+# Pools
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections kept in the database pool")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Database connections currently in use"
+)
+RENDER_POOL_PENDING = Gauge(
+    "render_pool_pending", "Chart renders waiting or running in the render pool"
+)
+BROADCAST_CHANNELS = Gauge(
+    "broadcast_channels", "Chart producers shared through the broadcast hub"
+)
@@ -1,8 +1,20 @@
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+# Formats the start_date and end_date of chart requests are accepted in
+CHART_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d")
+
+
+def parse_chart_date(value: str) -> datetime:
+    for date_format in CHART_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise ValueError("Dates must be YYYY-MM-DD")
 
 
 class EnergyData(BaseModel):
@@ -18,17 +30,115 @@ class EnergyData(BaseModel):
     )
 
 
+class ChartPoint(BaseModel):
+    respondent: str = Field(..., description="The respondent of the point's series")
+    type_name: str = Field(..., description="The category of the point's series")
+    period: datetime = Field(..., description="The period of the point")
+    value: float = Field(..., description="The value of the point")
+
+
 class EnergyType(str, Enum):
     D = "Demand"
-    NG = "Generation"
+    NG = "Net generation"
+
+
+class ChartMode(str, Enum):
+    FULL = "full"
+    DELTA = "delta"
+
+
+class DownsampleMethod(str, Enum):
+    LTTB = "lttb"
+    MIN_MAX = "minmax"
+
+
+class Resolution(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+    MONTH = "month"
+
+
+class Aggregate(str, Enum):
+    SUM = "sum"
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+
+
+class PacingMode(str, Enum):
+    DRAIN = "drain"
+    FIXED = "fixed"
+    ADAPTIVE = "adaptive"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    ARROW = "arrow"
+    PARQUET = "parquet"
 
 
 class StreamChartDataRequest(BaseModel):
-    respondent: str = Field(..., description="The respondent for the data")
-    type_name: EnergyType = Field(..., description="The category of the data")
+    respondents: list[str] = Field(
+        ..., min_length=1, description="The respondents to compare"
+    )
+    type_names: list[EnergyType] = Field(
+        ..., min_length=1, description="The categories of data to compare"
+    )
     start_date: str = Field(..., description="The start date for the data")
     end_date: str = Field(..., description="The end date for the data")
+    mode: ChartMode = Field(
+        ChartMode.FULL,
+        description="Re-render the whole chart per chunk, or send only new points",
+    )
+    max_points: Optional[int] = Field(
+        None, gt=2, description="Downsample the range to at most this many points"
+    )
+    downsample: DownsampleMethod = Field(
+        DownsampleMethod.LTTB, description="The downsampling algorithm"
+    )
+    resolution: Optional[Resolution] = Field(
+        None, description="Read pre-aggregated buckets of this size"
+    )
+    aggregate: Aggregate = Field(
+        Aggregate.AVG, description="How rolled up buckets are turned into a value"
+    )
+    pacing: PacingMode = Field(
+        PacingMode.ADAPTIVE, description="How chunks are paced to the client"
+    )
+    chunk_size: int = Field(
+        10, gt=0, description="Rows per chunk, the starting size when adaptive"
+    )
+    interval: float = Field(
+        2.0, ge=0, description="Seconds between chunks when pacing is fixed"
+    )
+
+    @field_validator("start_date", "end_date")
+    @classmethod
+    def check_date(cls, value: str) -> str:
+        parse_chart_date(value)
+        return value
+
+    @property
+    def series(self) -> list[tuple[str, str]]:
+        """
+        (respondent, type_name) of every line, in legend order
+        """
+        return [
+            (respondent, type_name.value)
+            for respondent in self.respondents
+            for type_name in self.type_names
+        ]
+
+
+class IngestionJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
 
 
 class EnergyDataRequest(BaseModel):
     params: Dict[str, Any]
+    batch_size: Optional[int] = Field(
+        None, gt=0, description="Rows per bulk insert, defaults to INSERT_BATCH_SIZE"
+    )
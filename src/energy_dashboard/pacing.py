@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from .models import PacingMode
+
+logger = logging.getLogger(__name__)
+
+# Bounds for the adaptive chunk size, in rows
+PACING_MIN_CHUNK_SIZE = int(os.getenv("PACING_MIN_CHUNK_SIZE", "10"))
+PACING_MAX_CHUNK_SIZE = int(os.getenv("PACING_MAX_CHUNK_SIZE", "1000"))
+# A chunk delivered within this many seconds means the client is keeping up
+PACING_DRAIN_THRESHOLD = float(os.getenv("PACING_DRAIN_THRESHOLD", "0.05"))
+
+
+async def _already_drained() -> float:
+    return 0.0
+
+
+class Pacer:
+    """
+    Decides how many rows go in the next chunk and how long to wait after it
+
+    drain:    send the next chunk as soon as the clients have taken the last one
+    fixed:    fixed-size chunks every `interval` seconds (replay speed)
+    adaptive: like drain, doubling the chunk size while clients keep up and
+              halving it when they fall behind
+
+    wait_drained resolves once every client has consumed what was sent and
+    returns the seconds it waited
+    """
+
+    def __init__(
+        self,
+        mode: PacingMode,
+        chunk_size: int,
+        interval: float,
+        wait_drained: Optional[Callable[[], Awaitable[float]]] = None,
+    ):
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.wait_drained = wait_drained or _already_drained
+        self.chunks = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.first_chunk_seconds: Optional[float] = None
+        self.complete_seconds: Optional[float] = None
+
+    async def pace(self, rows: int):
+        """
+        Call after each data chunk has been handed to the clients
+        """
+        self.chunks += 1
+        self.rows += rows
+        if self.first_chunk_seconds is None:
+            self.first_chunk_seconds = time.perf_counter() - self.started
+
+        if self.mode == PacingMode.FIXED:
+            await asyncio.sleep(self.interval)
+            return
+
+        waited = await self.wait_drained()
+        if self.mode == PacingMode.ADAPTIVE:
+            if waited <= PACING_DRAIN_THRESHOLD:
+                self.chunk_size = min(self.chunk_size * 2, PACING_MAX_CHUNK_SIZE)
+            else:
+                self.chunk_size = max(self.chunk_size // 2, PACING_MIN_CHUNK_SIZE)
+
+    def complete(self, name: str) -> dict:
+        """
+        Record the end of the stream and log its timings
+        """
+        self.complete_seconds = time.perf_counter() - self.started
+        summary = {
+            "mode": self.mode.value,
+            "chunks": self.chunks,
+            "rows": self.rows,
+            "first_chunk_seconds": self.first_chunk_seconds,
+            "complete_seconds": round(self.complete_seconds, 3),
+        }
+        logger.info(f"{name} stream finished: {summary}")
+        return summary
@@ -0,0 +1,156 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from .metrics import EIA_PAGE_CACHE_HITS, EIA_PAGE_CACHE_MISSES
+from .utils import ROOT_DIR, URLBuilder
+
+# Where downloaded EIA pages are kept, empty disables the cache
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", str(ROOT_DIR / ".eia_cache"))
+# Seconds a page that may still be revised by EIA is reused
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "300"))
+# EIA revises recent hours; queries ending earlier than this are final
+PAGE_CACHE_REVISION_HOURS = int(os.getenv("PAGE_CACHE_REVISION_HOURS", "168"))
+# Replay pages from the cache only, never calling the EIA API
+EIA_OFFLINE = os.getenv("EIA_OFFLINE", "0") == "1"
+
+
+class PageCacheMiss(LookupError):
+    """
+    An EIA page was asked for in offline mode and is not in the cache
+    """
+
+
+class PageCache:
+    """
+    Gzipped EIA response bodies on disk, one file per query
+    Files are named after a hash of the query string without the API key, so
+    the same page requested twice is one file whoever asked for it. Pages of
+    queries ending before the revision window never expire, others are reused
+    for `ttl` seconds
+    """
+
+    def __init__(self, directory: str, ttl: int, revision_hours: int, offline: bool):
+        self.directory = Path(directory) if directory else None
+        self.ttl = ttl
+        self.revision = timedelta(hours=revision_hours)
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(params: dict) -> str:
+        builder = URLBuilder()
+        for name, value in sorted(params.items()):
+            if name != "api_key":
+                builder.add_param(name, value)
+        return hashlib.sha256(builder.query_string().encode()).hexdigest()
+
+    def path(self, params: dict) -> Path:
+        key = self.key(params)
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def historical(self, params: dict, stored_at: float) -> bool:
+        """
+        Whether the query ended before EIA stopped revising its hours, when
+        the page was stored; its rows and total can no longer change
+        EIA hourly periods are UTC, an end that does not parse is not final
+        """
+        end = params.get("end")
+        if not end:
+            return False
+        try:
+            end = datetime.strptime(end, "%Y-%m-%dT%H")
+        except ValueError:
+            try:
+                end = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+            except ValueError:
+                return False
+        stored = datetime.fromtimestamp(stored_at, timezone.utc)
+        return end.replace(tzinfo=timezone.utc) < stored - self.revision
+
+    async def get(self, params: dict) -> Optional[bytes]:
+        """
+        The stored response body of the page, or None when it must be fetched
+        Offline, stale pages are replayed and missing ones raise PageCacheMiss
+        """
+        if self.directory is None:
+            if self.offline:
+                raise PageCacheMiss("EIA_OFFLINE is set but PAGE_CACHE_DIR is empty")
+            return None
+        body = await asyncio.to_thread(self._read, params)
+        if body is None:
+            self.misses += 1
+            EIA_PAGE_CACHE_MISSES.inc()
+            if self.offline:
+                raise PageCacheMiss(f"EIA page not cached: {self.path(params).name}")
+            return None
+        self.hits += 1
+        EIA_PAGE_CACHE_HITS.inc()
+        return body
+
+    def _read(self, params: dict) -> Optional[bytes]:
+        path = self.path(params)
+        try:
+            stored_at = path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        fresh = time.time() - stored_at < self.ttl
+        if not (self.offline or fresh or self.historical(params, stored_at)):
+            return None
+        return gzip.decompress(path.read_bytes())
+
+    async def put(self, params: dict, body: bytes):
+        if self.directory is not None:
+            await asyncio.to_thread(self._write, params, body)
+
+    def _write(self, params: dict, body: bytes):
+        path = self.path(params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, readers never see a partial page
+        fd, partial = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(gzip.compress(body, compresslevel=6))
+        os.replace(partial, path)
+
+    async def stats(self) -> dict:
+        # Listing the directory touches every file, off the event loop
+        pages, size = await asyncio.to_thread(self._usage)
+        lookups = self.hits + self.misses
+        return {
+            "directory": str(self.directory) if self.directory else None,
+            "offline": self.offline,
+            "ttl": self.ttl,
+            "revision_hours": self.revision / timedelta(hours=1),
+            "pages": pages,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _usage(self) -> tuple[int, int]:
+        """
+        Number and total size of the stored pages
+        """
+        pages = size = 0
+        if self.directory is None:
+            return pages, size
+        for path in self.directory.glob("*/*.json.gz"):
+            try:
+                size += path.stat().st_size
+            except FileNotFoundError:
+                continue
+            pages += 1
+        return pages, size
+
+
+page_cache = PageCache(
+    PAGE_CACHE_DIR, PAGE_CACHE_TTL, PAGE_CACHE_REVISION_HOURS, EIA_OFFLINE
+)
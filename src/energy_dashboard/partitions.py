@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import os
+import weakref
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import numpy as np
+from sqlalchemy import Table, delete, func, select, text, union_all, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .database import (
+    EnergyDataPartitionTable,
+    EnergyDataTable,
+    SeriesVersionTable,
+    energy_data_partition,
+)
+
+logger = logging.getLogger(__name__)
+
+# Store energy_data as one table per month, "false" keeps the single table
+PARTITION_ENERGY_DATA = os.getenv("PARTITION_ENERGY_DATA", "true").lower() == "true"
+
+# Rows written before partitioning was enabled
+LEGACY_TABLE = EnergyDataTable.__table__
+
+
+class PartitionFrozen(RuntimeError):
+    """
+    Rows were written to a month whose partition is frozen
+    """
+
+
+def next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def page_months(periods: np.ndarray) -> np.ndarray:
+    """
+    First hour of the month of each datetime64 period
+    """
+    return periods.astype("datetime64[M]").astype("datetime64[us]")
+
+
+def partition_name(month: datetime) -> str:
+    return f"{EnergyDataTable.__tablename__}_{month:%Y_%m}"
+
+
+def partition_select(tables: list[Table], build: Callable, *order_by):
+    """
+    build(table) for every partition as one statement, ordered by result
+    column names; SQLite merges the ordered arms instead of sorting the rows
+    """
+    stmts = [build(table) for table in tables]
+    stmt = stmts[0] if len(stmts) == 1 else union_all(*stmts)
+    return stmt.order_by(*order_by)
+
+
+class PartitionCatalog:
+    """
+    The monthly partitions of energy_data in one database
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        months: dict[datetime, Optional[datetime]],
+        schema_version: Optional[int] = None,
+    ):
+        self.enabled = enabled
+        # First hour of every month stored, and when it was frozen
+        self.months = months
+        # SQLite schema version the catalog was read at
+        self.schema_version = schema_version
+
+    def frozen(self, month: datetime) -> bool:
+        return self.months.get(month) is not None
+
+    def covering(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> list[Table]:
+        """
+        Partitions holding periods in [start, end] in time order, open bounds
+        reach every partition
+        The empty energy_data table stands in when none overlap, so callers
+        always have a statement to run
+        """
+        if not self.enabled:
+            return [LEGACY_TABLE]
+        months = sorted(
+            month
+            for month in self.months
+            if (start is None or next_month(month) > start)
+            and (end is None or month <= end)
+        )
+        return [energy_data_partition(partition_name(m)) for m in months] or [
+            LEGACY_TABLE
+        ]
+
+    def split(self, periods: np.ndarray, rows: list) -> list[tuple[Table, list]]:
+        """
+        Rows grouped by the partition they are written to, periods holding
+        the datetime64 period of each row
+        """
+        if not self.enabled:
+            return [(LEGACY_TABLE, rows)]
+        months = page_months(periods)
+        distinct = np.unique(months)
+        if len(distinct) == 1:
+            # A page usually falls in one month
+            return [(self.partition(distinct[0]), rows)]
+        return [
+            (self.partition(month), [rows[i] for i in np.flatnonzero(months == month)])
+            for month in distinct
+        ]
+
+    @staticmethod
+    def partition(month: np.datetime64) -> Table:
+        return energy_data_partition(partition_name(month.astype(datetime)))
+
+
+class EnergyDataPartitions:
+    """
+    Splits energy_data into one table per month
+    Queries only open the partitions overlapping their range, so their cost
+    follows the range asked for rather than the history kept. Old months can
+    be frozen (indexes rebuilt, writes refused) or dropped with one DROP TABLE
+    The catalog of each database is kept in memory and read again whenever
+    the schema version moved, as creating, freezing or dropping a month in
+    any process changes the schema; rows left in energy_data by earlier
+    versions are moved into partitions on first use
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._catalogs: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = asyncio.Lock()
+
+    async def open(self, session: AsyncSession) -> PartitionCatalog:
+        """
+        Catalog of the database the session is bound to
+        Read on its own connection, so the session has not started a read
+        transaction older than partitions created right after
+        """
+        engine = session.bind
+        catalog = self._catalogs.get(engine.sync_engine)
+        if catalog is not None and not catalog.enabled:
+            return catalog
+        version = await self._schema_version(engine)
+        if catalog is None or catalog.schema_version != version:
+            async with self._lock:
+                catalog = self._catalogs.get(engine.sync_engine)
+                if catalog is None or catalog.schema_version != version:
+                    catalog = await self._load(engine)
+                    self._catalogs[engine.sync_engine] = catalog
+        return catalog
+
+    @staticmethod
+    async def _schema_version(engine) -> int:
+        async with engine.connect() as conn:
+            return await conn.scalar(text("PRAGMA schema_version"))
+
+    async def _load(self, engine) -> PartitionCatalog:
+        if not self.enabled:
+            return PartitionCatalog(False, {})
+        async with engine.connect() as conn:
+            # Read first, a change made while loading triggers another load
+            version = await conn.scalar(text("PRAGMA schema_version"))
+            result = await conn.execute(
+                select(
+                    EnergyDataPartitionTable.month, EnergyDataPartitionTable.frozen_at
+                )
+            )
+            catalog = PartitionCatalog(True, dict(result.all()), version)
+
+            month = func.strftime("%Y-%m-01 00:00:00.000000", LEGACY_TABLE.c.period)
+            result = await conn.execute(select(month).distinct())
+            legacy = [datetime.fromisoformat(value) for value in result.scalars()]
+
+        for month in sorted(legacy):
+            await self._adopt(engine, catalog, month)
+        if legacy:
+            logger.info(f"Moved {len(legacy)} months of energy_data into partitions")
+        return catalog
+
+    async def _adopt(self, engine, catalog: PartitionCatalog, month: datetime):
+        """
+        Move the rows of one month from energy_data into its partition
+        """
+        table = energy_data_partition(partition_name(month))
+        in_month = (LEGACY_TABLE.c.period >= month) & (
+            LEGACY_TABLE.c.period < next_month(month)
+        )
+        names = [column.name for column in LEGACY_TABLE.columns if column.name != "id"]
+        async with engine.begin() as conn:
+            await self._create(conn, month)
+            rows = select(*(LEGACY_TABLE.c[name] for name in names)).where(in_month)
+            await conn.execute(
+                insert(table).from_select(names, rows).on_conflict_do_nothing()
+            )
+            await conn.execute(delete(LEGACY_TABLE).where(in_month))
+        catalog.months.setdefault(month, None)
+
+    @staticmethod
+    async def _create(conn, month: datetime):
+        table = energy_data_partition(partition_name(month))
+        await conn.execute(CreateTable(table, if_not_exists=True))
+        for index in table.indexes:
+            await conn.execute(CreateIndex(index, if_not_exists=True))
+        await conn.execute(
+            insert(EnergyDataPartitionTable)
+            .values(month=month, table_name=table.name, created_at=datetime.now())
+            .on_conflict_do_nothing()
+        )
+
+    async def ensure(self, session: AsyncSession, periods: np.ndarray):
+        """
+        Catalog with a partition for the month of every datetime64 period,
+        creating the missing ones in their own transaction
+        Raises PartitionFrozen when a period falls in a frozen month
+        """
+        catalog = await self.open(session)
+        if not catalog.enabled:
+            return catalog
+        months = {month.astype(datetime) for month in np.unique(page_months(periods))}
+        frozen = sorted(month for month in months if catalog.frozen(month))
+        if frozen:
+            raise PartitionFrozen(
+                f"Partition {partition_name(frozen[0])} is frozen, rows not written"
+            )
+        missing = sorted(months - catalog.months.keys())
+        if missing:
+            async with self._lock, session.bind.begin() as conn:
+                for month in missing:
+                    await self._create(conn, month)
+            for month in missing:
+                catalog.months.setdefault(month, None)
+        return catalog
+
+    async def freeze(self, session: AsyncSession, month: datetime) -> Optional[dict]:
+        """
+        Compact a month and make it read-only
+        Its indexes are rebuilt densely packed, and triggers refuse any later
+        insert, update or delete; the freed pages go back to the OS
+        """
+        catalog = await self.open(session)
+        if month not in catalog.months:
+            return None
+        name = partition_name(month)
+        if not catalog.frozen(month):
+            frozen_at = datetime.now()
+            async with self._lock, session.bind.begin() as conn:
+                await conn.execute(text(f'REINDEX "{name}"'))
+                for action in ("INSERT", "UPDATE", "DELETE"):
+                    await conn.execute(
+                        text(
+                            f'CREATE TRIGGER IF NOT EXISTS "{name}_frozen_{action.lower()}" '
+                            f'BEFORE {action} ON "{name}" '
+                            f"BEGIN SELECT RAISE(ABORT, '{name} is frozen'); END"
+                        )
+                    )
+                await conn.execute(
+                    update(EnergyDataPartitionTable)
+                    .where(EnergyDataPartitionTable.month == month)
+                    .values(frozen_at=frozen_at)
+                )
+            catalog.months[month] = frozen_at
+            await self._release_pages(session)
+        return (await self.describe(session, month))[0]
+
+    async def drop(self, session: AsyncSession, month: datetime) -> bool:
+        """
+        Delete the raw rows of a month; its rollup buckets are kept, so
+        coarse charts still cover it
+        """
+        catalog = await self.open(session)
+        if month not in catalog.months:
+            return False
+        async with self._lock, session.bind.begin() as conn:
+            await conn.execute(text(f'DROP TABLE IF EXISTS "{partition_name(month)}"'))
+            await conn.execute(
+                delete(EnergyDataPartitionTable).where(
+                    EnergyDataPartitionTable.month == month
+                )
+            )
+            # Every process holding rows of the month in memory drops them
+            await conn.execute(
+                update(SeriesVersionTable).values(
+                    version=SeriesVersionTable.version + 1
+                )
+            )
+        del catalog.months[month]
+        await self._release_pages(session)
+        return True
+
+    @staticmethod
+    async def _release_pages(session: AsyncSession):
+        # Only shrinks databases created with auto_vacuum=INCREMENTAL
+        # The pragma frees one page per row it steps through, all of them
+        # have to be fetched, which only the driver cursor does
+        async with session.bind.begin() as conn:
+            raw = await conn.get_raw_connection()
+            cursor = await raw.driver_connection.execute("PRAGMA incremental_vacuum")
+            await cursor.fetchall()
+            await cursor.close()
+
+    async def describe(
+        self, session: AsyncSession, month: Optional[datetime] = None
+    ) -> list[dict]:
+        """
+        Rows and state of every partition in time order, or only of month
+        """
+        await self.open(session)
+        stmt = select(EnergyDataPartitionTable).order_by(EnergyDataPartitionTable.month)
+        if month is not None:
+            stmt = stmt.where(EnergyDataPartitionTable.month == month)
+        result = await session.execute(stmt)
+        partitions = []
+        for partition in result.scalars():
+            table = energy_data_partition(partition.table_name)
+            rows = await session.scalar(select(func.count()).select_from(table))
+            partitions.append(
+                {
+                    "month": f"{partition.month:%Y-%m}",
+                    "table": partition.table_name,
+                    "rows": rows,
+                    "created_at": partition.created_at,
+                    "frozen_at": partition.frozen_at,
+                }
+            )
+        return partitions
+
+
+partitions = EnergyDataPartitions(PARTITION_ENERGY_DATA)
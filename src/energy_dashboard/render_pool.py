@@ -0,0 +1,95 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .metrics import CHART_RENDER_SECONDS, RENDER_POOL_PENDING
+
+# "process" renders in worker processes, "thread" in worker threads
+CHART_RENDER_EXECUTOR = os.getenv("CHART_RENDER_EXECUTOR", "process")
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+# Renders waiting or running at once; further callers wait for a free slot
+CHART_RENDER_QUEUE_SIZE = int(os.getenv("CHART_RENDER_QUEUE_SIZE", "8"))
+
+
+class ChartRenderPool:
+    """
+    Runs CPU bound chart rendering (Bokeh figure building and components())
+    away from the event loop, with a bounded number of pending renders
+    """
+
+    def __init__(self, kind: str, workers: int, queue_size: int):
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="chart-render"
+            )
+        else:
+            # Spawned workers do not inherit the event loop or database threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            # Start the workers and import Bokeh in them before the first chart
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+        self._slots = asyncio.Semaphore(self.queue_size)
+
+    def shutdown(self):
+        if self._executor is not None:
+            # Joined so workers still warming up do not outlive the server
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, fn: Callable, *args, **kwargs):
+        """
+        Run fn(*args) in the pool, waiting for a free slot when the queue is full
+        fn and its arguments must be picklable for the process executor
+        """
+        self.start()
+        async with self._slots:
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                with CHART_RENDER_SECONDS.time():
+                    return await loop.run_in_executor(
+                        self._executor, _call, fn, args, kwargs
+                    )
+            finally:
+                self.pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+        }
+
+
+def _call(fn: Callable, args: tuple, kwargs: dict):
+    return fn(*args, **kwargs)
+
+
+def _warm_up():
+    # charts.py imports Bokeh lazily, load it before the first chart
+    import bokeh.embed  # noqa: F401
+    import bokeh.plotting  # noqa: F401
+
+    import energy_dashboard.charts  # noqa: F401
+
+
+render_pool = ChartRenderPool(
+    CHART_RENDER_EXECUTOR, CHART_RENDER_WORKERS, CHART_RENDER_QUEUE_SIZE
+)
+RENDER_POOL_PENDING.set_function(lambda: render_pool.pending)
@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import numpy as np
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import (
+    DailyRollupTable,
+    HourlyRollupTable,
+    MonthlyRollupTable,
+)
+from .dimensions import DimensionSet
+from .models import Aggregate, Resolution, StreamChartDataRequest
+from .partitions import PartitionCatalog, next_month, partition_select
+
+
+@dataclass(frozen=True)
+class Grain:
+    resolution: Resolution
+    table: type
+    # SQLite strftime format matching SQLAlchemy's DateTime storage format,
+    # so buckets compare correctly against bound datetime parameters
+    bucket_format: str
+    # Approximate bucket width, used to pick a grain for a requested point count
+    width: timedelta
+    floor: Callable[[datetime], datetime]
+    next: Callable[[datetime], datetime]
+
+
+# Ordered from the finest to the coarsest grain
+GRAINS = [
+    Grain(
+        Resolution.HOUR,
+        HourlyRollupTable,
+        "%Y-%m-%d %H:00:00.000000",
+        timedelta(hours=1),
+        lambda dt: dt.replace(minute=0, second=0, microsecond=0),
+        lambda dt: dt + timedelta(hours=1),
+    ),
+    Grain(
+        Resolution.DAY,
+        DailyRollupTable,
+        "%Y-%m-%d 00:00:00.000000",
+        timedelta(days=1),
+        lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0),
+        lambda dt: dt + timedelta(days=1),
+    ),
+    Grain(
+        Resolution.MONTH,
+        MonthlyRollupTable,
+        "%Y-%m-01 00:00:00.000000",
+        timedelta(days=30),
+        lambda dt: dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+        next_month,
+    ),
+]
+GRAINS_BY_RESOLUTION = {grain.resolution: grain for grain in GRAINS}
+
+
+def refresh_stmt(
+    grain: Grain,
+    catalog: PartitionCatalog,
+    respondent_id: int,
+    type_id: int,
+    start,
+    end,
+):
+    """
+    Recompute the buckets of one series between start (inclusive) and end (exclusive)
+    from the raw rows, replacing whatever the rollup held for them
+    """
+    table = grain.table
+    rows = partition_select(
+        catalog.covering(start, end),
+        lambda partition: select(
+            partition.c.period,
+            partition.c.respondent_id,
+            partition.c.type_id,
+            partition.c.value,
+        ).where(
+            and_(
+                partition.c.respondent_id == respondent_id,
+                partition.c.type_id == type_id,
+                partition.c.period >= start,
+                partition.c.period < end,
+            )
+        ),
+    ).subquery()
+    bucket = func.strftime(grain.bucket_format, rows.c.period)
+    source = select(
+        bucket,
+        rows.c.respondent_id,
+        rows.c.type_id,
+        func.sum(rows.c.value),
+        func.min(rows.c.value),
+        func.max(rows.c.value),
+        func.count(rows.c.value),
+    ).group_by(bucket, rows.c.respondent_id, rows.c.type_id)
+    stmt = insert(table).from_select(
+        [
+            "bucket",
+            "respondent_id",
+            "type_id",
+            "value_sum",
+            "value_min",
+            "value_max",
+            "value_count",
+        ],
+        source,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["respondent_id", "type_id", "bucket"],
+        set_={
+            "value_sum": stmt.excluded.value_sum,
+            "value_min": stmt.excluded.value_min,
+            "value_max": stmt.excluded.value_max,
+            "value_count": stmt.excluded.value_count,
+        },
+    )
+
+
+def series_spans(columns: dict) -> dict:
+    """
+    Lowest and highest period written for each (respondent_id, type_id) of
+    energy_data column lists, periods as datetime64
+    """
+    if not len(columns["period"]):
+        return {}
+    series = np.column_stack([columns["respondent_id"], columns["type_id"]])
+    keys, index = np.unique(series, axis=0, return_inverse=True)
+    periods = np.asarray(columns["period"], dtype="datetime64[us]")
+    low = np.full(len(keys), np.datetime64("9999-12-31", "us"))
+    high = np.full(len(keys), np.datetime64("0001-01-01", "us"))
+    np.minimum.at(low, index, periods)
+    np.maximum.at(high, index, periods)
+    return {
+        (int(respondent_id), int(type_id)): (
+            first.astype(datetime),
+            last.astype(datetime),
+        )
+        for (respondent_id, type_id), first, last in zip(keys, low, high)
+    }
+
+
+def refresh_stmts(spans: dict, catalog: PartitionCatalog) -> list:
+    """
+    Statements that bring every rollup up to date after rows were written
+    over the series_spans spans
+    Only the buckets touched by the rows are recomputed, from the partitions
+    holding them
+    """
+    stmts = []
+    for (respondent_id, type_id), (low, high) in spans.items():
+        for grain in GRAINS:
+            start = grain.floor(low)
+            end = grain.next(grain.floor(high))
+            stmts.append(
+                refresh_stmt(grain, catalog, respondent_id, type_id, start, end)
+            )
+    return stmts
+
+
+def choose_grain(
+    params: StreamChartDataRequest, start_date: datetime, end_date: datetime
+) -> Optional[Grain]:
+    """
+    Pick the rollup that answers the request, or None to read the raw rows
+    An explicit resolution wins, otherwise the coarsest grain that still yields
+    max_points buckets over the range
+    """
+    if params.resolution:
+        return GRAINS_BY_RESOLUTION[params.resolution]
+    if params.max_points:
+        span = end_date - start_date
+        for grain in reversed(GRAINS):
+            if span / grain.width >= params.max_points:
+                return grain
+    return None
+
+
+def aggregate_column(table, aggregate: Aggregate):
+    if aggregate == Aggregate.SUM:
+        return table.value_sum
+    if aggregate == Aggregate.MIN:
+        return table.value_min
+    if aggregate == Aggregate.MAX:
+        return table.value_max
+    return table.value_sum / table.value_count
+
+
+def rollup_stmt(
+    grain: Grain,
+    params: StreamChartDataRequest,
+    start_date: datetime,
+    end_date: datetime,
+    dims: DimensionSet,
+):
+    """
+    Select (respondent_id, type_id, period, value) buckets of the requested
+    series from a rollup table, grouped by series in index order
+    """
+    table = grain.table
+    return (
+        select(
+            table.respondent_id,
+            table.type_id,
+            table.bucket,
+            aggregate_column(table, params.aggregate),
+        )
+        .where(
+            and_(
+                table.respondent_id.in_(dims.respondents.lookup(params.respondents)),
+                table.type_id.in_(
+                    dims.types.lookup_names(t.value for t in params.type_names)
+                ),
+                table.bucket >= grain.floor(start_date),
+                table.bucket <= end_date,
+            )
+        )
+        .order_by(table.respondent_id, table.type_id, table.bucket)
+    )
@@ -1,38 +1,93 @@
-import asyncio
 import logging
-import math
-from typing import Annotated
-
-import httpx
-import pandas as pd
-from bokeh.embed import components
-from bokeh.models import ColumnDataSource
-from bokeh.models import NumeralTickFormatter, DatetimeTickFormatter, HoverTool, Range1d
-from bokeh.plotting import figure
-from fastapi import APIRouter, Depends, FastAPI, Request, Query, Form
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Annotated, Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Query, Form
 from fastapi import Body
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
 
-from energy_dashboard.database import AsyncSessionLocal, SessionLocal
-from energy_dashboard.models import EnergyDataRequest, StreamChartDataRequest
+from energy_dashboard import charts, export
+from energy_dashboard.analytics import range_stats
+from energy_dashboard.broadcast import chart_hub
+from energy_dashboard.cache import query_cache, series_versions
+from energy_dashboard.database import (
+    AsyncSessionLocal,
+    dispose_db,
+    get_engine,
+    init_db,
+)
+from energy_dashboard.hot_window import hot_window
+from energy_dashboard.jobs import ingestion_jobs
+from energy_dashboard.metrics import SSE_CHUNK_BYTES, SSE_OPEN_STREAMS, registry
+from energy_dashboard.pacing import Pacer
+from energy_dashboard.page_cache import page_cache
+from energy_dashboard.partitions import partitions
+from energy_dashboard.models import (
+    Aggregate,
+    ChartMode,
+    DownsampleMethod,
+    EnergyDataRequest,
+    EnergyType,
+    ExportFormat,
+    PacingMode,
+    Resolution,
+    StreamChartDataRequest,
+)
+from energy_dashboard.render_pool import render_pool
 from energy_dashboard.services import EnergyDataService
-from energy_dashboard.utils import TEMPLATES_DIR
+from energy_dashboard.snapshots import ChartSnapshot, chart_snapshots
+from energy_dashboard.sync import delta_sync
+from energy_dashboard.utils import TEMPLATES_DIR, create_http_client
 
 CHART_TOPIC = "chart"
 
 BUFFER_SIZE = 10
 
-app = FastAPI()
+# About one point per horizontal pixel of the 1250px wide chart
+CHART_MAX_POINTS = 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The engine and schema are created here, not when the modules are imported
+    await init_db()
+    # Recent days of every series are served from memory
+    await hot_window.load()
+    # One pooled HTTP client for the lifetime of the app
+    app.state.http_client = create_http_client()
+    # Chart rendering runs in worker processes, off the event loop
+    render_pool.start()
+    # Seed jobs left unfinished by a previous run resume from their checkpoint
+    await ingestion_jobs.start(app.state.http_client)
+    # Fetch the hours newer than what is stored on a schedule
+    delta_sync.start()
+    yield
+    await delta_sync.stop()
+    await ingestion_jobs.stop()
+    render_pool.shutdown()
+    await app.state.http_client.aclose()
+    await dispose_db()
+
+
 router = APIRouter()
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 
 # Dependency function to get an instance of the database
 ## Async db: https://fastapi.tiangolo.com/tutorial/dependencies/
+## The session takes a pooled connection on its first query, not here
 async def get_async_db():
     async_db = AsyncSessionLocal()
     try:
@@ -41,20 +96,12 @@ async def get_async_db():
         await async_db.close()
 
 
-## Sync db
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # Dependency function to get an instance of EnergyDataService
 def get_energy_service(
-    db: Session = Depends(get_db), async_db: AsyncSession = Depends(get_async_db)
+    request: Request,
+    async_db: AsyncSession = Depends(get_async_db),
 ):
-    return EnergyDataService(async_db, db, httpx.AsyncClient())
+    return EnergyDataService(async_db, request.app.state.http_client)
 
 
 def render_sse_html_chunk(event, chunk, attrs=None):
@@ -65,65 +112,135 @@ def render_sse_html_chunk(event, chunk, attrs=None):
     return html_chunk
 
 
-@app.get("/stream", name="stream", response_class=StreamingResponse)
+def render_sse_delta_chunk(event, payload, attrs=None):
+    if attrs is None:
+        attrs = {}
+    tmpl = templates.get_template("partials/streaming_delta.jinja2")
+    return tmpl.render(event=event, payload=payload, attrs=attrs)
+
+
+@router.get("/stream", name="stream", response_class=StreamingResponse)
 async def stream_energy_data(
-    request: Request, service: EnergyDataService = Depends(get_energy_service)
+    request: Request,
+    service: EnergyDataService = Depends(get_energy_service),
+    pacing: PacingMode = Query(PacingMode.DRAIN),
+    chunk_size: int = Query(BUFFER_SIZE, gt=0),
+    interval: float = Query(1.0, ge=0),
 ):
     """
     Stream the energy data as Server-Sent Events (SSE)
     """
 
     async def streaming_data():
-        strm = service.stream_all()
-        async for data in strm:
-            yield f"data: {data.model_dump_json(indent=4)}\n\n"
-            await asyncio.sleep(1)
+        # Nothing is buffered between the generator and the client here, so a
+        # chunk counts as drained once the server has taken it
+        pacer = Pacer(pacing, chunk_size, interval)
+        SSE_OPEN_STREAMS.inc()
+        try:
+            async for records in service.stream_all(chunk_size):
+                chunk = "".join(
+                    f"data: {data.model_dump_json()}\n\n" for data in records
+                )
+                SSE_CHUNK_BYTES.observe(len(chunk))
+                yield chunk
+                await pacer.pace(len(records))
+            pacer.complete("stream")
+        finally:
+            SSE_OPEN_STREAMS.dec()
 
     return StreamingResponse(streaming_data(), media_type="text/event-stream")
 
 
-@app.post("/trigger-streaming", response_class=HTMLResponse)
+@router.post("/trigger-streaming", response_class=HTMLResponse)
 async def trigger_streaming(
     request: Request,
-    respondent: Annotated[str, Form()],
-    type_name: Annotated[str, Form()],
+    respondent: Annotated[list[str], Form()],
+    type_name: Annotated[list[str], Form()],
     start_date: Annotated[str, Form()],
     end_date: Annotated[str, Form()],
+    mode: Annotated[ChartMode, Form()] = ChartMode.DELTA,
+    max_points: Annotated[int, Form()] = CHART_MAX_POINTS,
 ):
+    query = urlencode(
+        dict(
+            respondent=respondent,
+            type_name=type_name,
+            start_date=start_date,
+            end_date=end_date,
+            mode=mode.value,
+            max_points=max_points,
+        ),
+        doseq=True,
+    )
     sse_config = dict(
         listener="hx-sse-listener",
-        path=f"/stream-chart?respondent={respondent}&type_name={type_name}&start_date={start_date}&end_date={end_date}",
+        path=f"/stream-chart?{query}",
         topics=[CHART_TOPIC, "Terminate"],
     )
     return templates.TemplateResponse(
-        "index.jinja2", {"request": request, "sse_config": sse_config}
+        request, "index.jinja2", {"sse_config": sse_config}
     )
 
 
-@app.get("/stream-chart", response_class=StreamingResponse)
+@router.get("/stream-chart", response_class=StreamingResponse)
 async def energy_stream(
-    service: EnergyDataService = Depends(get_energy_service),
-    respondent: str = Query(None),
-    type_name: str = Query(None),
+    request: Request,
+    respondent: list[str] = Query(None),
+    type_name: list[str] = Query(None),
     start_date: str = Query(None),
     end_date: str = Query(None),
+    mode: ChartMode = Query(ChartMode.FULL),
+    max_points: int = Query(None, gt=2),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB),
+    resolution: Resolution = Query(None),
+    aggregate: Aggregate = Query(Aggregate.AVG),
+    pacing: PacingMode = Query(PacingMode.ADAPTIVE),
+    chunk_size: int = Query(BUFFER_SIZE, gt=0),
+    interval: float = Query(2.0, ge=0),
 ):
-    if not all([respondent, type_name, start_date, end_date]):
+    # Both repeated (?respondent=MISO&respondent=PJM) and comma separated
+    # (?respondent=MISO,PJM) lists are accepted
+    respondents, type_names = split_values(respondent), split_values(type_name)
+    if not all([respondents, type_names, start_date, end_date]):
         return JSONResponse(
             status_code=400,
             content={"message": "All parameters must be provided"},
         )
 
-    params = StreamChartDataRequest(
-        respondent=respondent,
-        type_name=type_name,
+    params = chart_request(
+        respondents=respondents,
+        type_names=type_names,
         start_date=start_date,
         end_date=end_date,
+        mode=mode,
+        max_points=max_points,
+        downsample=downsample,
+        resolution=resolution,
+        aggregate=aggregate,
+        pacing=pacing,
+        chunk_size=chunk_size,
+        interval=interval,
     )
 
+    # Finished charts of closed ranges are served whole from the snapshot cache
+    start, end = EnergyDataService.parse_dates(params)
+    snapshot_key = chart_snapshots.key(params, start, end)
+    if snapshot_key:
+        # Snapshots of series another process wrote to are dropped first
+        await series_versions.sync(get_engine())
+        snapshot = chart_snapshots.get(snapshot_key)
+        if snapshot is not None:
+            return snapshot_response(request, snapshot)
+        scope = EnergyDataService.cache_scope(params, start, end)
+        versions = series_versions.versions(scope)
+
+    labels = [charts.series_label(*series) for series in params.series]
+
     async def update_chart_state(energy_data, chart_state):
-        chart_state["y_state"].extend([data.value for data in energy_data])
-        chart_state["x_state"].extend([data.period for data in energy_data])
+        for label, (hours, values) in group_series(energy_data).items():
+            x_state, y_state = chart_state.setdefault(label, ([], []))
+            x_state.extend(hours)
+            y_state.extend(values)
         return chart_state
 
     async def create_context(div, script):
@@ -141,137 +258,433 @@ async def energy_stream(
         )
         return f"{chunk}\n\n".encode("utf-8")
 
-    async def handle_termination_condition(energy_data):
-        if energy_data is None or len(energy_data) < BUFFER_SIZE:
-            return True
-        return False
+    def render_delta(event, energy_data):
+        payload = charts.delta_payload(
+            group_series(energy_data),
+            title=charts.chart_title(labels, [data.period for data in energy_data]),
+        )
+        chunk = render_sse_delta_chunk(
+            event,
+            payload,
+            attrs={"id": "linechart-delta", "hx-swap-oob": "true"},
+        )
+        return f"{chunk}\n\n".encode("utf-8")
 
-    async def streaming_data(chart_params=params):
-        chart_state = {
-            "x_state": [],
-            "y_state": [],
-        }
+    def render_termination():
+        return render_chunk(
+            "Terminate",
+            "",
+            attrs={"id": "hx-sse-listener", "hx-swap-oob": "true"},
+        )
 
-        async for energy_data in buffer_stream(service, chart_params):
-            print(f"Received {len(energy_data)} records")
+    async def store_snapshot(chart):
+        # The final chart and Terminate, what a viewer ends up with
+        if snapshot_key:
+            await series_versions.sync(get_engine())
+            chart_snapshots.set(
+                snapshot_key, scope, versions, chart + render_termination()
+            )
+
+    async def streaming_data(service, pacer, chart_params=params):
+        # (hours, values) of every line, in legend order
+        chart_state = {label: ([], []) for label in labels}
+
+        chart = b""
+        async for energy_data in buffer_stream(service, chart_params, pacer):
             chart_state = await update_chart_state(energy_data, chart_state)
             div, script = await create_chart(chart_state)
             context = await create_context(div, script)
-            if await handle_termination_condition(energy_data):
-                yield render_chunk(
-                    "Terminate",
-                    "",
-                    attrs={"id": "hx-sse-listener", "hx-swap-oob": "true"},
-                )
-                break
-            else:
-                yield render_chunk(
+            chart = render_chunk(
+                CHART_TOPIC,
+                context,
+                attrs={"id": "linechart", "hx-swap-oob": "true"},
+            )
+            yield chart
+            await pacer.pace(len(energy_data))
+
+        pacer.complete("chart")
+        yield render_termination()
+        await store_snapshot(chart)
+
+    async def delta_streaming_data(service, pacer, chart_params=params):
+        # Send the empty figure once, then only the new points of each buffer
+        div, script = await render_pool.render(
+            charts.render_skeleton,
+            labels,
+            chart_params.start_date,
+            chart_params.end_date,
+        )
+        context = await create_context(div, script)
+        yield render_chunk(
+            CHART_TOPIC,
+            context,
+            attrs={"id": "linechart", "hx-swap-oob": "true"},
+        )
+
+        # Points are only kept to render the snapshot of a closed range
+        chart_state = {label: ([], []) for label in labels}
+        async for energy_data in buffer_stream(service, chart_params, pacer):
+            yield render_delta(CHART_TOPIC, energy_data)
+            if snapshot_key:
+                chart_state = await update_chart_state(energy_data, chart_state)
+            await pacer.pace(len(energy_data))
+
+        pacer.complete("chart")
+        yield render_termination()
+        if snapshot_key:
+            # Like the full mode, a range without rows is snapshot as Terminate
+            chart = b""
+            if any(hours for hours, _ in chart_state.values()):
+                div, script = await create_chart(chart_state)
+                context = await create_context(div, script)
+                chart = render_chunk(
                     CHART_TOPIC,
                     context,
                     attrs={"id": "linechart", "hx-swap-oob": "true"},
                 )
-                await asyncio.sleep(2)
-
-    def prepare_data(chart_state):
-        values = [value for value in chart_state["y_state"]]
-        hours = [period for period in chart_state["x_state"]]
-        source = ColumnDataSource(data=dict(hours=hours, values=values))
-        return source
-
-    def create_figure(hours):
-        fig = figure(
-            x_axis_type="datetime",
-            height=500,
-            tools="xpan",
-            width=1250,
-            title=f"MISO - Hour: {max(hours)}",
-        )
-        return fig
-
-    def format_figure(fig):
-        fig.title.align = "left"
-        fig.title.text_font_size = "1em"
-        fig.yaxis[0].formatter = NumeralTickFormatter(format="0.0a")
-        fig.yaxis.axis_label = "Megawatt Hours"
-        fig.y_range.start = 50000
-        fig.y_range.end = 125000
-        fig.xaxis.major_label_orientation = math.pi / 4
-
-        # Convert start_date and end_date from string to datetime
-        fig.x_range = Range1d(
-            start=pd.Timestamp(params.start_date), end=pd.Timestamp(params.end_date)
-        )
+            await store_snapshot(chart)
 
-        fig.xaxis.ticker.desired_num_ticks = 24
-        fig.xaxis.formatter = DatetimeTickFormatter(
-            days="%m/%d/%Y, %H:%M:%S",  # Format for day-level ticks
-            hours="%m/%d/%Y, %H:%M:%S",  # Format for hour-level ticks
+    async def create_chart(chart_state):
+        div, script = await render_pool.render(
+            charts.render_chart,
+            chart_state,
+            params.start_date,
+            params.end_date,
+            title=charts.chart_title(
+                labels, [hour for hours, _ in chart_state.values() for hour in hours]
+            ),
         )
-        return fig
-
-    def add_line_and_hover(fig, source):
-        fig.line(
-            x="hours",
-            y="values",
-            source=source,
-            line_width=2,
+        return div, script
+
+    async def produce(channel):
+        # The producer is shared by every viewer of the chart, so it owns its
+        # session instead of borrowing the first viewer's request dependencies
+        pacer = Pacer(
+            params.pacing, params.chunk_size, params.interval, channel.wait_drained
         )
-        hover = HoverTool(
-            tooltips=[
-                ("Value", "@values{0.00}"),
-                ("Hours", "@hours{%F %T}"),
-            ],
-            formatters={
-                "@hours": "datetime",
-            },
-            mode="vline",
-            show_arrow=False,
+        async with AsyncSessionLocal() as async_db:
+            service = EnergyDataService(async_db, request.app.state.http_client)
+            if params.mode == ChartMode.DELTA:
+                stream = delta_streaming_data(service, pacer)
+            else:
+                stream = streaming_data(service, pacer)
+            async for chunk in stream:
+                yield chunk
+
+    return StreamingResponse(
+        # A failed chart still ends with Terminate, or htmx reconnects forever
+        chart_hub.subscribe(chart_key(params), produce, on_error=render_termination),
+        media_type="text/event-stream",
+    )
+
+
+def snapshot_response(request: Request, snapshot: ChartSnapshot) -> Response:
+    """
+    The snapshot as one response, or 304 when the client already holds it
+    """
+    headers = {
+        "ETag": snapshot.etag,
+        # Cached copies are revalidated, the snapshot changes with the data
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    accepts_gzip = accepts_encoding(request.headers.get("accept-encoding"), "gzip")
+    if snapshot.gzipped and accepts_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return Response(
+        snapshot.content(accepts_gzip), media_type="text/event-stream", headers=headers
+    )
+
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    """
+    Whether the Accept-Encoding header allows coding, by its q-value or
+    else the one of *; q=0 refuses it
+    """
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities.get(coding, qualities.get("*", 0.0)) > 0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def chart_request(**fields) -> StreamChartDataRequest:
+    """
+    StreamChartDataRequest of query parameters, invalid values are answered
+    with 422 like those of the parameters FastAPI validates
+    """
+    try:
+        return StreamChartDataRequest(**fields)
+    except ValidationError as exc:
+        errors = exc.errors(include_url=False, include_context=False)
+        raise RequestValidationError(
+            [{**error, "loc": ("query", *error["loc"])} for error in errors]
         )
-        fig.add_tools(hover)
-        return fig
 
-    async def create_chart(chart_state):
-        source = prepare_data(chart_state)
-        fig = create_figure(chart_state["x_state"])
-        fig = format_figure(fig)
-        fig = add_line_and_hover(fig, source)
-        script, div = components(fig)
-        return div, script
 
-    return StreamingResponse(streaming_data(), media_type="text/event-stream")
+def split_values(values: Optional[list[str]]) -> list[str]:
+    return [value for item in values or [] for value in item.split(",") if value]
+
+
+def group_series(energy_data) -> dict[str, tuple[list, list]]:
+    """
+    (hours, values) of a buffer of points, by the label of their line
+    """
+    series = {}
+    for data in energy_data:
+        label = charts.series_label(data.respondent, data.type_name)
+        hours, values = series.setdefault(label, ([], []))
+        hours.append(data.period)
+        values.append(data.value)
+    return series
+
+
+def chart_key(params: StreamChartDataRequest) -> str:
+    """
+    Viewers of charts with the same normalized parameters share one producer
+    """
+    start_date, end_date = EnergyDataService.parse_dates(params)
+    pacing = f"{params.pacing.value}:{params.chunk_size}:{params.interval}"
+    key = query_cache.make_key(params, start_date, end_date)
+    return f"{params.mode.value}:{pacing}:{key}"
 
 
 async def buffer_stream(
     service: EnergyDataService,
     chart_params: StreamChartDataRequest,
+    pacer: Pacer,
     row_count=BUFFER_SIZE,
 ):
+    # The pacer may resize chunks between yields
     buffer = []
     async for energy_data in service.stream_all(row_count, chart_params):
         for data in energy_data:
             buffer.append(data)
-        if len(buffer) >= BUFFER_SIZE:
+        if len(buffer) >= pacer.chunk_size:
             yield buffer
             buffer = []
     if buffer:
         yield buffer
 
 
-@app.get("/", name="index")
+@router.get("/", name="index")
 async def index(request: Request):
     # Serve the dashboard using the index.jinja2 template
-    return templates.TemplateResponse("index.jinja2", {"request": request})
+    return templates.TemplateResponse(request, "index.jinja2")
 
 
-@app.post("/api/v1/seed-data/")
-async def seed_energy_data(
-    request_body: EnergyDataRequest = Body(...),
-    service: EnergyDataService = Depends(get_energy_service),
+@router.post("/api/v1/seed-data/", status_code=202)
+async def seed_energy_data(request_body: EnergyDataRequest = Body(...)):
+    """
+    Queue a background seed job and return its id right away
+    """
+    return await ingestion_jobs.submit(request_body.params, request_body.batch_size)
+
+
+@router.get("/api/v1/seed-data/")
+async def list_seed_jobs(limit: int = Query(50, gt=0)):
+    return await ingestion_jobs.recent(limit)
+
+
+@router.get("/api/v1/seed-data/{job_id}")
+async def seed_job_status(job_id: str):
+    job = await ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/api/v1/seed-data/{job_id}/resume")
+async def resume_seed_job(job_id: str):
+    job = await ingestion_jobs.resume(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/api/v1/sync/", status_code=202)
+async def sync_energy_data():
+    """
+    Queue jobs fetching only the hours newer than each stored series
+    """
+    return await delta_sync.run()
+
+
+@router.get("/api/v1/sync/")
+async def sync_status():
+    return delta_sync.stats()
+
+
+@router.get("/api/v1/cache/stats")
+async def cache_stats():
+    return query_cache.stats()
+
+
+@router.get("/api/v1/chart-snapshots/stats")
+async def chart_snapshot_stats():
+    return chart_snapshots.stats()
+
+
+@router.get("/api/v1/stats")
+async def energy_stats(
+    respondent: list[str] = Query(None),
+    type_name: list[str] = Query(None),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    async_db: AsyncSession = Depends(get_async_db),
 ):
-    return await service.fetch_data(params=request_body.params)
+    """
+    Peak, mean, load factor, percentiles and hour-of-day profile of every
+    series over the range, with the same series and date fields as /stream-chart
+    """
+    respondents, type_names = split_values(respondent), split_values(type_name)
+    if not all([respondents, type_names, start_date, end_date]):
+        return JSONResponse(
+            status_code=400,
+            content={"message": "All parameters must be provided"},
+        )
+    params = chart_request(
+        respondents=respondents,
+        type_names=type_names,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return await range_stats(async_db, params)
+
+
+@router.get("/api/v1/export")
+async def export_energy_data(
+    request: Request,
+    format: ExportFormat = Query(ExportFormat.NDJSON),
+    respondent: list[str] = Query(None),
+    type_name: list[str] = Query(None),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    batch_size: int = Query(export.EXPORT_BATCH_SIZE, gt=0),
+):
+    """
+    Stream the rows matching the optional series and date filters as NDJSON,
+    an Arrow IPC stream or Parquet, one batch of rows at a time; without
+    respondents every respondent but US48 is exported
+    """
+    if not export.available(format):
+        return JSONResponse(
+            status_code=501,
+            content={"message": f"The {format.value} export needs pyarrow"},
+        )
+    respondents = split_values(respondent)
+    try:
+        type_names = [EnergyType(name).value for name in split_values(type_name)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unknown type_name")
+    start, end = parse_date(start_date), parse_date(end_date)
+
+    async def batches():
+        # The stream outlives the request dependencies, so it owns its session
+        async with AsyncSessionLocal() as async_db:
+            service = EnergyDataService(async_db, request.app.state.http_client)
+            async for columns in service.export_columns(
+                respondents, type_names, start, end, batch_size
+            ):
+                yield columns
+
+    return StreamingResponse(
+        export.encode(format, batches()),
+        media_type=export.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="energy_data.{format.value}"'
+        },
+    )
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+
+@router.get("/api/v1/page-cache/stats")
+async def page_cache_stats():
+    return await page_cache.stats()
+
+
+@router.get("/api/v1/hot-window/stats")
+async def hot_window_stats():
+    return hot_window.stats()
+
+
+def parse_month(month: str) -> datetime:
+    try:
+        return datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Month must be YYYY-MM")
+
+
+@router.get("/api/v1/partitions/")
+async def list_partitions(async_db: AsyncSession = Depends(get_async_db)):
+    return await partitions.describe(async_db)
+
+
+@router.post("/api/v1/partitions/{month}/freeze")
+async def freeze_partition(month: str, async_db: AsyncSession = Depends(get_async_db)):
+    """
+    Compact a month of raw rows and refuse further writes to it
+    """
+    partition = await partitions.freeze(async_db, parse_month(month))
+    if partition is None:
+        raise HTTPException(status_code=404, detail="Partition not found")
+    return partition
+
+
+@router.delete("/api/v1/partitions/{month}", status_code=204)
+async def drop_partition(month: str, async_db: AsyncSession = Depends(get_async_db)):
+    """
+    Drop the raw rows of a month, its rollups are kept
+    """
+    if not await partitions.drop(async_db, parse_month(month)):
+        raise HTTPException(status_code=404, detail="Partition not found")
+    # Cached results and the hot window may hold rows of the month
+    await query_cache.clear()
+    chart_snapshots.clear()
+    await hot_window.load()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Stage timings, stream and pool gauges in the Prometheus text format
+    """
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get("/api/v1/broadcast/stats")
+async def broadcast_stats():
+    return chart_hub.stats()
 
 
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logging.error(f"Validation error: {exc} in request: {request}")
     return JSONResponse(
@@ -280,5 +693,18 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-# Include the router for API endpoints
-app.include_router(router)
+def create_app() -> FastAPI:
+    """
+    Build the application
+    The engine, HTTP client, worker pools and schema are set up by the
+    lifespan when the server starts, so creating or importing the app is cheap
+    """
+    app = FastAPI(lifespan=lifespan)
+    # Include the router for API endpoints
+    app.include_router(router)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    return app
+
+
+# For `uvicorn energy_dashboard.routes:app`, `--factory ...:create_app` also works
+app = create_app()
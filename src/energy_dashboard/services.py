@@ -1,16 +1,39 @@
+import asyncio
+import functools
+import itertools
 import logging
 import os
+import time
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Optional
 
 import httpx
+import numpy as np
+import orjson
 from dotenv import load_dotenv
-from sqlalchemy import insert, select, Row, and_
+from sqlalchemy import Table, bindparam, select, and_, true
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
 
-from .database import EnergyDataTable, database
-from .models import EnergyData, StreamChartDataRequest
+from .cache import CacheScope, query_cache, series_versions
+from .database import SeriesVersionTable
+from .dimensions import DimensionSet, dimensions
+from .downsample import downsample
+from .hot_window import hot_window
+from .metrics import (
+    EIA_PARSE_SECONDS,
+    EIA_REQUEST_SECONDS,
+    INSERT_BATCH_SECONDS,
+    QUERY_FIRST_ROW_SECONDS,
+    ROLLUP_REFRESH_SECONDS,
+    ROW_MATERIALIZE_SECONDS,
+    ROWS_INGESTED,
+)
+from .models import ChartPoint, EnergyData, StreamChartDataRequest, parse_chart_date
+from .page_cache import page_cache
+from .partitions import LEGACY_TABLE, partition_select, partitions
+from .rollups import choose_grain, refresh_stmts, rollup_stmt, series_spans
 from .utils import URLBuilder
 
 load_dotenv()
@@ -19,13 +42,36 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of rows sent in each bulk (executemany) INSERT during ingestion
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "500"))
+
+# Rows fetched from the database per round trip when streaming, independent
+# of the (usually much smaller) buffers handed to the caller
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "1000"))
+
+# Number of EIA pages downloaded at the same time during ingestion
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+
+# EnergyDataTable columns and the EIA record fields they are read from
+RECORD_FIELDS = {
+    "period": "period",
+    "respondent": "respondent",
+    "respondent_name": "respondent-name",
+    "type": "type",
+    "type_name": "type-name",
+    "value": "value",
+    "value_units": "value-units",
+}
+
+# energy_data columns of the upsert parameter tuples, in statement order
+UPSERT_COLUMNS = ("period", "respondent_id", "type_id", "value", "value_units_id")
+
 
 class EnergyDataService:
-    def __init__(self, async_db: AsyncSession, db: Session, client: httpx.AsyncClient):
+    def __init__(self, async_db: AsyncSession, client: httpx.AsyncClient):
         self.client = client
         self.api_key = os.getenv("API_KEY")
         self.async_db = async_db
-        self.db = db
 
     def build_url(self, params: dict) -> str:
         # Create an instance of URLBuilder
@@ -39,120 +85,622 @@ class EnergyDataService:
         url_builder.add_api_key(self.api_key)
         return url_builder.build()
 
-    async def fetch_data(self, params) -> dict:
-        while True:
-            # Build the URL using the parameters
-            url = self.build_url(params)
+    async def fetch_page(self, params: dict, offset: int) -> dict:
+        """
+        Download and decode a single page of the EIA API
+        Pages already on disk are read from the page cache instead
+        """
+        page_params = {**params, "offset": offset}
+        body = await page_cache.get(page_params)
+        if body is None:
+            # Build the URL using the parameters and the page offset
+            url = self.build_url(page_params)
 
             # Send a GET request to the API
-            response = await self.client.get(url)
-
-            # Parse the response as JSON
-            data = response.json()
-
-            # Break the loop if there is no data in the response
-            if not data["response"]["data"]:
-                break
-
-            # Process each item in the data
-            for item in data["response"]["data"]:
-                # Convert the value to float, or 0.0 if it is None
-                value = float(item["value"]) if item["value"] is not None else 0.0
-
-                # Parse the period string into a datetime object
-                period = datetime.strptime(item["period"], "%Y-%m-%dT%H")
-
-                # Create an insert query for the EnergyData table
-                query = insert(EnergyDataTable).values(
-                    value=value,
-                    period=period,
-                    respondent=item["respondent"],
-                    respondent_name=item["respondent-name"],
-                    type=item["type"],
-                    type_name=item["type-name"],
-                    value_units=item["value-units"],
-                )
+            with EIA_REQUEST_SECONDS.time():
+                response = await self.client.get(url)
+            response.raise_for_status()
+            body = response.content
+            await page_cache.put(page_params, body)
 
-                # Execute the query
-                await database.execute(query)
+        # Parse the response as JSON, orjson decodes pages several times faster
+        with EIA_PARSE_SECONDS.time():
+            return orjson.loads(body)
 
-            # Increment the offset parameter for the next iteration
-            params["offset"] += params["length"]
+    async def fetch_data(
+        self,
+        params,
+        batch_size: int = INSERT_BATCH_SIZE,
+        concurrency: int = FETCH_CONCURRENCY,
+        checkpoint: Optional[Callable[..., Awaitable]] = None,
+    ) -> dict:
+        """
+        Page through the EIA API and bulk insert every page
+        The first page tells us the total row count, the remaining pages are
+        downloaded by `concurrency` workers while completed pages are inserted
+        Each page is written inside a single transaction, in batches of batch_size rows
+        After every page, checkpoint(offset=..., total=..., pages=..., rows=...,
+        checkpoint_pages=..., checkpoint_rows=...) is awaited with the offset
+        below which every page has been written, so an interrupted run can
+        resume from there, and the pages and rows written below it
+        Returns a summary of the ingestion run
+        """
+        params = dict(params)
+        offset = params.pop("offset", 0)
+        length = params["length"]
+        pages = 0
+        rows = 0
+        started = time.perf_counter()
 
-        return data
+        # The first page also carries the total number of rows for the query
+        first_page = await self.fetch_page(params, offset)
+        total = int(first_page["response"]["total"])
+        offsets = iter(range(offset + length, total, length))
+
+        # Completed pages wait here for the inserter, bounding memory use
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+        async def download():
+            for page_offset in offsets:
+                page = await self.fetch_page(params, page_offset)
+                await queue.put((page_offset, page))
+
+        # Pages can complete out of order, the checkpoint only moves past
+        # offsets whose page and every page before it have been written
+        written: dict[int, tuple[int, int]] = {}
+        checkpoint_offset = offset
+        checkpoint_pages = checkpoint_rows = 0
+
+        workers = [asyncio.create_task(download()) for _ in range(concurrency)]
+        done = asyncio.gather(*workers)
+        try:
+            # Insert the first page while the workers fetch the next ones
+            item = (offset, first_page)
+            while item is not None:
+                page_offset, page = item
+                page_pages = page_rows = 0
+                if page["response"]["data"]:
+                    page_rows = await self.insert_page(
+                        page["response"]["data"], batch_size
+                    )
+                    page_pages = 1
+                    rows += page_rows
+                    pages += 1
+
+                written[page_offset] = (page_pages, page_rows)
+                while checkpoint_offset in written:
+                    page_pages, page_rows = written.pop(checkpoint_offset)
+                    checkpoint_pages += page_pages
+                    checkpoint_rows += page_rows
+                    checkpoint_offset += length
+                if checkpoint:
+                    await checkpoint(
+                        offset=checkpoint_offset,
+                        total=total,
+                        pages=pages,
+                        rows=rows,
+                        checkpoint_pages=checkpoint_pages,
+                        checkpoint_rows=checkpoint_rows,
+                    )
+                item = await self.next_page(queue, done)
+            # Surface download errors once the queue is drained
+            await done
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "pages": pages,
+            "rows": rows,
+            "total": total,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info(f"Ingested {rows} rows from {pages} pages in {elapsed:.2f}s")
+        return summary
+
+    @staticmethod
+    async def next_page(queue: asyncio.Queue, done: asyncio.Future):
+        """
+        Wait for the next downloaded page, or None once every worker has finished
+        """
+        while True:
+            if not queue.empty():
+                return queue.get_nowait()
+            if done.done():
+                return None
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                return getter.result()
+            getter.cancel()
+
+    async def insert_page(self, items: list[dict], batch_size: int) -> int:
+        """
+        Bulk insert one page of EIA records inside a single transaction
+        items: list of raw records from the EIA response
+        """
+        columns = self.parse_page(items)
+        # Strings are stored once in the dimension tables, rows reference ids
+        dims = await dimensions.intern(self.async_db, columns)
+        encoded = dims.encode(columns)
+        rows = self.upsert_rows(encoded)
+        # Partitions of new months are created before the page transaction
+        catalog = await partitions.ensure(self.async_db, encoded["period"])
+        try:
+            conn = await self.async_db.connection()
+            for table, table_rows in catalog.split(encoded["period"], rows):
+                query = self.upsert_sql(table)
+                for i in range(0, len(table_rows), batch_size):
+                    # One statement compiled once and run for the whole batch
+                    with INSERT_BATCH_SECONDS.time():
+                        await conn.exec_driver_sql(
+                            query, table_rows[i : i + batch_size]
+                        )
+
+            # Recompute the rollup buckets touched by this page
+            spans = series_spans(encoded)
+            with ROLLUP_REFRESH_SECONDS.time():
+                for query in refresh_stmts(spans, catalog):
+                    await self.async_db.execute(query)
+            # Other processes find the series moved with the rows
+            versions = []
+            if spans:
+                result = await self.async_db.execute(self.version_stmt(spans))
+                versions = result.all()
+            await self.async_db.commit()
+        except Exception:
+            await self.async_db.rollback()
+            raise
+        ROWS_INGESTED.inc(len(rows))
+        hot_window.write(columns)
+
+        # Cached chart results and snapshots overlapping the new rows are now stale
+        for respondent_id, type_id, version in versions:
+            respondent, type_name = dims.series(respondent_id, type_id)
+            low, high = spans[(respondent_id, type_id)]
+            await series_versions.advance(respondent, type_name, version, low, high)
+        return len(rows)
+
+    @staticmethod
+    def upsert_stmt(table=LEGACY_TABLE):
+        """
+        INSERT into energy_data or one of its partitions that updates rows
+        already stored for the same (period, respondent, type), so re-seeding
+        a range never duplicates data
+        Rows are dimension encoded, see DimensionSet.encode
+        Executed with a list of rows, so it is compiled once and the driver
+        runs it with executemany
+        """
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=["period", "respondent_id", "type_id"],
+            set_={
+                "value": stmt.excluded.value,
+                "value_units_id": stmt.excluded.value_units_id,
+            },
+        )
+
+    @staticmethod
+    @functools.cache
+    def upsert_sql(table: Table = LEGACY_TABLE) -> str:
+        """
+        upsert_stmt of the table compiled once to SQL with positional
+        parameters, run by the driver with tuples of UPSERT_COLUMNS
+        """
+        stmt = EnergyDataService.upsert_stmt(table).values(
+            {column: bindparam(column) for column in UPSERT_COLUMNS}
+        )
+        return str(stmt.compile(dialect=sqlite.dialect()))
+
+    @staticmethod
+    def upsert_rows(columns: dict[str, list]) -> list[tuple]:
+        """
+        Parameter tuples of UPSERT_COLUMNS of energy_data column lists
+        The driver gets them without SQLAlchemy's per-value processing, so
+        periods are formatted as its SQLite DateTime stores them
+        """
+        if not len(columns["period"]):
+            return []
+        periods = np.datetime_as_string(columns["period"], unit="us")
+        periods = np.char.replace(periods, "T", " ", count=1).tolist()
+        return list(
+            zip(
+                periods,
+                columns["respondent_id"],
+                columns["type_id"],
+                columns["value"],
+                columns["value_units_id"],
+            )
+        )
+
+    @staticmethod
+    def version_stmt(series):
+        """
+        Move each (respondent_id, type_id) to its next data version, returning
+        the versions stored
+        """
+        stmt = insert(SeriesVersionTable).values(
+            [
+                {"respondent_id": respondent_id, "type_id": type_id, "version": 1}
+                for respondent_id, type_id in series
+            ]
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=["respondent_id", "type_id"],
+            set_={"version": SeriesVersionTable.version + 1},
+        ).returning(
+            SeriesVersionTable.respondent_id,
+            SeriesVersionTable.type_id,
+            SeriesVersionTable.version,
+        )
+
+    @staticmethod
+    def parse_page(items: list[dict]) -> dict[str, list]:
+        """
+        Convert a page of raw EIA records into EnergyData column lists
+        Periods and values are converted for the whole page in one vectorized
+        pass instead of a strptime and float() per record; periods are kept
+        as one datetime64 array
+        """
+        # Only ingestion needs pandas, the app starts without loading it
+        import pandas as pd
+
+        columns = {
+            column: [item[field] for item in items]
+            for column, field in RECORD_FIELDS.items()
+        }
+        periods = pd.to_datetime(columns["period"], format="%Y-%m-%dT%H")
+        columns["period"] = periods.to_numpy(dtype="datetime64[us]")
+        # Missing values are stored as 0.0
+        values = pd.to_numeric(pd.Series(columns["value"], dtype=object))
+        columns["value"] = values.fillna(0.0).astype(float).tolist()
+        return columns
 
-    def list_all(self):
+    async def list_all(self) -> list[EnergyData]:
         """
-        Return all rows from the EnergyDataTable
+        Return all rows of every partition
         Filter out the US48 respondent
         """
-        return (
-            self.db.query(EnergyDataTable)
-            .filter(EnergyDataTable.respondent != "US48")
-            .order_by(EnergyDataTable.respondent, EnergyDataTable.period)
-            .all()
+        dims = await dimensions.refresh(self.async_db)
+        stmt = await self.prepare_stmt(None, STREAM_FETCH_SIZE, self.async_db)
+        result = await self.async_db.stream(stmt)
+        data = []
+        async for rows in result.partitions(STREAM_FETCH_SIZE):
+            data.extend(dims.energy_data(row) for row in rows)
+        return data
+
+    async def export_columns(
+        self,
+        respondents: Optional[list[str]] = None,
+        type_names: Optional[list[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        batch_size: int = STREAM_FETCH_SIZE,
+    ) -> AsyncGenerator[dict[str, list], None]:
+        """
+        Stream the rows matching the filters as batches of EnergyData column
+        lists, at most batch_size rows each, so memory stays bounded whatever
+        the size of the export
+        """
+        dims = await dimensions.refresh(self.async_db)
+        stmt = await self.rows_stmt(
+            self.async_db,
+            batch_size,
+            respondents,
+            type_names,
+            start_date,
+            end_date,
         )
+        result = await self.async_db.stream(stmt)
+        async for rows in result.partitions(batch_size):
+            yield dims.columns(rows)
 
     async def stream_all(
-        self, row_count=10, chart_params: StreamChartDataRequest = None
+        self, row_count=10, chart_params: Optional[StreamChartDataRequest] = None
     ) -> AsyncGenerator[EnergyData, None]:
-        stmt = await self.prepare_stmt(chart_params, row_count)
-        results_stream = await self.async_db.stream(stmt)
-        buffer = []
-        async for partition in results_stream.partitions(row_count):
-            for rows in partition:
-                for row in rows:
-                    row_dict = self.row_to_dict(row)
-                    data = EnergyData.model_validate(row_dict)
-                    buffer.append(data)
-                    if len(buffer) >= row_count:
-                        yield buffer
-                        buffer = []
-        if buffer:
+        if chart_params is None:
+            async for buffer in self.stream_rows(row_count):
+                yield buffer
+            return
+
+        # Serve repeated chart queries from the query cache
+        start_date, end_date = self.parse_dates(chart_params)
+        key = query_cache.make_key(chart_params, start_date, end_date)
+        # Results of series another process wrote to are dropped first
+        await series_versions.sync(self.async_db.bind)
+        cached = await query_cache.get(key)
+        if cached is not None:
+            for i in range(0, len(cached), row_count):
+                yield cached[i : i + row_count]
+            return
+
+        # Taken before the query, so rows written while it runs are noticed
+        scope = self.cache_scope(chart_params, start_date, end_date)
+        versions = series_versions.versions(scope)
+        results = []
+        async for buffer in self.stream_points(chart_params, row_count):
+            results.extend(buffer)
             yield buffer
 
+        # Only reached when the caller consumed the whole result
+        await series_versions.sync(self.async_db.bind)
+        await query_cache.set(key, scope, versions, results)
+
+    async def stream_rows(self, row_count=10) -> AsyncGenerator[EnergyData, None]:
+        """
+        Stream every row as EnergyData
+        Rows come back as typed Core tuples, so the models are built without
+        ORM entities or a string round trip; their strings come from the
+        in-memory dimensions
+        """
+        dims = await dimensions.refresh(self.async_db)
+        stmt = await self.prepare_stmt(
+            None, max(row_count, STREAM_FETCH_SIZE), self.async_db
+        )
+        started = time.perf_counter()
+        results_stream = await self.async_db.stream(stmt)
+        batches = results_stream.partitions(STREAM_FETCH_SIZE)
+        async for batch in batches:
+            if started is not None:
+                QUERY_FIRST_ROW_SECONDS.observe(time.perf_counter() - started)
+                started = None
+            with ROW_MATERIALIZE_SECONDS.time():
+                data = [dims.energy_data(row) for row in batch]
+            for i in range(0, len(data), row_count):
+                yield data[i : i + row_count]
+
     @staticmethod
-    async def prepare_stmt(params: StreamChartDataRequest, row_count):
-        if params:
-            # Convert start_date and end_date from string to datetime
-            try:
-                start_date = datetime.strptime(
-                    params.start_date, "%Y-%m-%d %H:%M:%S.%f"
-                )
-                end_date = datetime.strptime(params.end_date, "%Y-%m-%d %H:%M:%S.%f")
-            except ValueError:
-                start_date = datetime.strptime(params.start_date, "%Y-%m-%d")
-                end_date = datetime.strptime(params.end_date, "%Y-%m-%d")
-
-            stmt = (
-                select(EnergyDataTable)
-                .where(
-                    and_(
-                        EnergyDataTable.respondent == params.respondent,
-                        EnergyDataTable.period >= start_date,
-                        EnergyDataTable.period <= end_date,
-                        EnergyDataTable.type_name == params.type_name.value,
+    def cache_scope(
+        chart_params: StreamChartDataRequest, start_date: datetime, end_date: datetime
+    ) -> CacheScope:
+        """
+        Period range a chart result depends on
+        Rollup buckets depend on every row of the buckets at both ends of the range
+        """
+        grain = choose_grain(chart_params, start_date, end_date)
+        if grain:
+            start_date = grain.floor(start_date)
+            end_date = grain.next(grain.floor(end_date))
+        return CacheScope(
+            tuple(chart_params.respondents),
+            tuple(t.value for t in chart_params.type_names),
+            start_date,
+            end_date,
+        )
+
+    async def stream_points(
+        self, chart_params: StreamChartDataRequest, row_count=10
+    ) -> AsyncGenerator[list[ChartPoint], None]:
+        """
+        Stream the points of every series of a chart, series after series
+        One query reads all series in index order, only the series and chart
+        columns, from the coarsest rollup that answers the request; with
+        max_points set each series is downsampled in one vectorized pass so
+        long ranges cost about as much as short ones to draw
+        Raw ranges inside the hot window are read from memory instead
+        """
+        start_date, end_date = self.parse_dates(chart_params)
+        dims = await dimensions.open(
+            self.async_db,
+            chart_params.respondents,
+            [t.value for t in chart_params.type_names],
+        )
+        if choose_grain(chart_params, start_date, end_date) is None:
+            # Series another process wrote to are read again first
+            await series_versions.sync(self.async_db.bind)
+            hot = hot_window.select(
+                dims.order(chart_params.series), start_date, end_date
+            )
+            if hot is not None:
+                for points in self.window_points(chart_params, hot, row_count):
+                    yield points
+                return
+
+        stmt = await self.prepare_stmt(
+            chart_params, max(row_count, STREAM_FETCH_SIZE), self.async_db
+        )
+
+        started = time.perf_counter()
+        if not chart_params.max_points:
+            results_stream = await self.async_db.stream(stmt)
+            async for batch in results_stream.partitions(STREAM_FETCH_SIZE):
+                if started is not None:
+                    QUERY_FIRST_ROW_SECONDS.observe(time.perf_counter() - started)
+                    started = None
+                with ROW_MATERIALIZE_SECONDS.time():
+                    points = [
+                        ChartPoint.model_construct(
+                            respondent=dims.respondents.code(respondent_id),
+                            type_name=dims.types.name(type_id),
+                            period=period,
+                            value=value,
+                        )
+                        for respondent_id, type_id, period, value in batch
+                    ]
+                for i in range(0, len(points), row_count):
+                    yield points[i : i + row_count]
+            return
+
+        results_stream = await self.async_db.stream(stmt)
+        rows = await results_stream.all()
+        QUERY_FIRST_ROW_SECONDS.observe(time.perf_counter() - started)
+
+        # Rows arrive grouped by series, each line keeps max_points points
+        for (respondent_id, type_id), series in itertools.groupby(
+            rows, key=lambda row: (row[0], row[1])
+        ):
+            respondent, type_name = dims.series(respondent_id, type_id)
+            _, _, periods, values = zip(*series)
+            x = np.array(periods, dtype="datetime64[us]").astype(np.int64)
+            y = np.array(values, dtype=float)
+            keep = downsample(
+                x.astype(float), y, chart_params.max_points, chart_params.downsample
+            )
+
+            with ROW_MATERIALIZE_SECONDS.time():
+                points = [
+                    ChartPoint.model_construct(
+                        respondent=respondent,
+                        type_name=type_name,
+                        period=periods[i],
+                        value=values[i],
                     )
+                    for i in keep
+                ]
+            for i in range(0, len(points), row_count):
+                yield points[i : i + row_count]
+
+    @staticmethod
+    def window_points(chart_params: StreamChartDataRequest, series, row_count):
+        """
+        Points of the series sliced from the hot window, downsampled like the
+        database rows
+        """
+        for respondent, type_name, periods, values in series:
+            if chart_params.max_points:
+                keep = downsample(
+                    periods.astype(np.int64).astype(float),
+                    values,
+                    chart_params.max_points,
+                    chart_params.downsample,
                 )
-                .order_by(EnergyDataTable.respondent, EnergyDataTable.period)
-                .execution_options(stream_results=True, max_row_buffer=row_count)
+                periods, values = periods[keep], values[keep]
+
+            with ROW_MATERIALIZE_SECONDS.time():
+                points = [
+                    ChartPoint.model_construct(
+                        respondent=respondent,
+                        type_name=type_name,
+                        period=period,
+                        value=value,
+                    )
+                    for period, value in zip(periods.tolist(), values.tolist())
+                ]
+            for i in range(0, len(points), row_count):
+                yield points[i : i + row_count]
+
+    @staticmethod
+    def parse_dates(params: StreamChartDataRequest) -> tuple[datetime, datetime]:
+        # Convert start_date and end_date from string to datetime
+        return parse_chart_date(params.start_date), parse_chart_date(params.end_date)
+
+    @staticmethod
+    def chart_filter(
+        params: StreamChartDataRequest,
+        start_date: datetime,
+        end_date: datetime,
+        dims: DimensionSet,
+        table=LEGACY_TABLE,
+    ):
+        return EnergyDataService.row_filter(
+            dims,
+            table,
+            params.respondents,
+            [t.value for t in params.type_names],
+            start_date,
+            end_date,
+        )
+
+    @staticmethod
+    def row_filter(
+        dims: DimensionSet,
+        table=LEGACY_TABLE,
+        respondents: Optional[list[str]] = None,
+        type_names: Optional[list[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ):
+        """
+        Respondent, type and period predicates, only for the filters given
+        """
+        clauses = []
+        if respondents:
+            clauses.append(
+                table.c.respondent_id.in_(dims.respondents.lookup(respondents))
             )
+        if start_date is not None:
+            clauses.append(table.c.period >= start_date)
+        if end_date is not None:
+            clauses.append(table.c.period <= end_date)
+        if type_names:
+            clauses.append(table.c.type_id.in_(dims.types.lookup_names(type_names)))
+        return and_(true(), *clauses)
+
+    @staticmethod
+    async def prepare_stmt(
+        params: StreamChartDataRequest, row_count, async_db: AsyncSession
+    ):
+        """
+        Statement streaming the chart rows, or every row without params
+        Raw rows are read only from the partitions overlapping the range
+        Series are selected and ordered by their dimension ids
+        """
+        if not params:
+            return await EnergyDataService.rows_stmt(async_db, row_count)
+        catalog = await partitions.open(async_db)
+        dims = await dimensions.open(
+            async_db, params.respondents, [t.value for t in params.type_names]
+        )
+        start_date, end_date = EnergyDataService.parse_dates(params)
+        grain = choose_grain(params, start_date, end_date)
+        if grain:
+            stmt = rollup_stmt(grain, params, start_date, end_date, dims)
         else:
-            stmt = (
-                select(EnergyDataTable)
-                .filter(EnergyDataTable.respondent != "US48")
-                .order_by(EnergyDataTable.respondent, EnergyDataTable.period)
-                .execution_options(stream_results=True, max_row_buffer=row_count)
+            # Only the series and chart columns, all of them held by the
+            # composite index, in its order so every series is one range scan
+            stmt = partition_select(
+                catalog.covering(start_date, end_date),
+                lambda table: select(
+                    table.c.respondent_id,
+                    table.c.type_id,
+                    table.c.period,
+                    table.c.value,
+                ).where(
+                    EnergyDataService.chart_filter(
+                        params, start_date, end_date, dims, table
+                    )
+                ),
+                "respondent_id",
+                "type_id",
+                "period",
             )
-        return stmt
+        return stmt.execution_options(stream_results=True, max_row_buffer=row_count)
 
     @staticmethod
-    def row_to_dict(row: Row):
+    async def rows_stmt(
+        async_db: AsyncSession,
+        row_count,
+        respondents: Optional[list[str]] = None,
+        type_names: Optional[list[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ):
         """
-        Convert a SQLAlchemy Row object to a dictionary
-        row: Row (SQLAlchemy Row object)
+        Statement streaming whole rows matching the filters, from the
+        partitions overlapping the period; without respondents every
+        respondent but US48
         """
-        m = {}
-        for column in row.__table__.columns:
-            m[column.name] = str(getattr(row, column.name))
-        return m
+        catalog = await partitions.open(async_db)
+        dims = await dimensions.open(
+            async_db, respondents or ["US48"], type_names or []
+        )
+
+        def rows(table):
+            stmt = select(*table.columns).where(
+                EnergyDataService.row_filter(
+                    dims, table, respondents, type_names, start_date, end_date
+                )
+            )
+            if not respondents:
+                us48 = dims.respondents.lookup(["US48"])
+                stmt = stmt.where(table.c.respondent_id.not_in(us48))
+            return stmt
+
+        stmt = partition_select(
+            catalog.covering(start_date, end_date), rows, "respondent_id", "period"
+        )
+        return stmt.execution_options(stream_results=True, max_row_buffer=row_count)
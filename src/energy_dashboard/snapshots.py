@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from .cache import CacheScope, QueryResultCache, series_versions
+from .models import StreamChartDataRequest
+
+# Memory kept for finished charts, least recently used charts are evicted first
+CHART_SNAPSHOT_CACHE_MB = int(os.getenv("CHART_SNAPSHOT_CACHE_MB", "64"))
+# EIA revises recent hours; charts ending earlier than this are final
+CHART_SNAPSHOT_REVISION_HOURS = int(os.getenv("CHART_SNAPSHOT_REVISION_HOURS", "168"))
+# Smaller snapshots are not worth compressing
+CHART_SNAPSHOT_GZIP_BYTES = int(os.getenv("CHART_SNAPSHOT_GZIP_BYTES", "1024"))
+
+
+class ChartSnapshot(NamedTuple):
+    """
+    The final SSE events of a chart, gzipped when large
+    """
+
+    body: bytes
+    gzipped: bool
+    etag: str
+    scope: CacheScope
+
+    def content(self, accepts_gzip: bool) -> bytes:
+        if self.gzipped and not accepts_gzip:
+            return gzip.decompress(self.body)
+        return self.body
+
+
+class ChartSnapshotCache:
+    """
+    Finished /stream-chart responses of closed ranges, bounded by size
+    A repeat request gets the final chart and the Terminate event at once,
+    instead of a fresh query, render and paced stream. Snapshots overlapping
+    rows any process writes are dropped, and a chart rendered while its
+    series were written to is not kept, see SeriesVersions
+    """
+
+    def __init__(self, max_bytes: int, revision_hours: int, gzip_bytes: int):
+        self.max_bytes = max_bytes
+        self.revision = timedelta(hours=revision_hours)
+        self.gzip_bytes = gzip_bytes
+        self._snapshots: OrderedDict[str, ChartSnapshot] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(
+        self, params: StreamChartDataRequest, start: datetime, end: datetime
+    ) -> Optional[str]:
+        """
+        Key of the normalized request, None when the range is still open
+        """
+        if end > datetime.now() - self.revision:
+            return None
+        return QueryResultCache.make_key(params, start, end)
+
+    def get(self, key: str) -> Optional[ChartSnapshot]:
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._snapshots.move_to_end(key)
+        return snapshot
+
+    def set(self, key: str, scope: CacheScope, versions: tuple[int, ...], body: bytes):
+        """
+        Keep a chart whose series are still at the versions it was read at
+        """
+        if versions != series_versions.versions(scope):
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        gzipped = len(body) >= self.gzip_bytes
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+        if len(body) > self.max_bytes:
+            return
+
+        self._discard(key)
+        self._snapshots[key] = ChartSnapshot(body, gzipped, etag, scope)
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._snapshots.popitem(last=False)
+            self.bytes -= len(evicted.body)
+            self.evictions += 1
+
+    def _discard(self, key: str):
+        snapshot = self._snapshots.pop(key, None)
+        if snapshot is not None:
+            self.bytes -= len(snapshot.body)
+
+    async def invalidate(
+        self, respondent: str, type_name: str, start: datetime, end: datetime
+    ):
+        """
+        Drop the snapshots of the series overlapping [start, end]
+        """
+        for key, snapshot in list(self._snapshots.items()):
+            if snapshot.scope.overlaps(respondent, type_name, start, end):
+                self._discard(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self._snapshots.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._snapshots),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+chart_snapshots = ChartSnapshotCache(
+    CHART_SNAPSHOT_CACHE_MB * 2**20,
+    CHART_SNAPSHOT_REVISION_HOURS,
+    CHART_SNAPSHOT_GZIP_BYTES,
+)
+series_versions.attach(chart_snapshots)
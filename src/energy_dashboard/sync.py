@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import desc, func, select
+
+from .database import AsyncSessionLocal, MonthlyRollupTable
+from .dimensions import dimensions
+from .jobs import IngestionJobRunner, ingestion_jobs
+from .models import IngestionJobStatus
+from .partitions import partition_select, partitions
+
+logger = logging.getLogger(__name__)
+
+# Seconds between scheduled syncs, hourly by default; 0 turns the schedule off.
+# POST /api/v1/sync/ runs one sync either way
+SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", "3600"))
+# Rows requested per EIA page when syncing
+SYNC_PAGE_LENGTH = int(os.getenv("SYNC_PAGE_LENGTH", "5000"))
+
+# Sent with every sync request, next to the facets and start period
+SYNC_PARAMS = {
+    "frequency": "hourly",
+    "data[0]": "value",
+    "sort[0][column]": "period",
+    "sort[0][direction]": "asc",
+}
+
+
+async def latest_periods(session) -> dict[tuple[str, str], datetime]:
+    """
+    Latest stored period of every (respondent, type)
+    The monthly rollup narrows each series to its last month, so every lookup
+    is an index seek in its last partition instead of a scan of energy_data
+    """
+    catalog = await partitions.open(session)
+    dims = await dimensions.refresh(session)
+    series = await session.execute(
+        select(
+            MonthlyRollupTable.respondent_id,
+            MonthlyRollupTable.type_id,
+            func.max(MonthlyRollupTable.bucket),
+        ).group_by(MonthlyRollupTable.respondent_id, MonthlyRollupTable.type_id)
+    )
+    latest = {}
+    for respondent_id, type_id, last_month in series.all():
+        period = await session.scalar(
+            partition_select(
+                catalog.covering(last_month),
+                lambda table: select(table.c.period).where(
+                    table.c.respondent_id == respondent_id,
+                    table.c.type_id == type_id,
+                    table.c.period >= last_month,
+                ),
+                desc("period"),
+            ).limit(1)
+        )
+        if period:
+            key = (dims.respondents.code(respondent_id), dims.types.code(type_id))
+            latest[key] = period
+    return latest
+
+
+def sync_params(latest: dict[tuple[str, str], datetime]) -> list[dict]:
+    """
+    EIA params asking only for the hours after what is stored
+    Series of one type that are up to the same hour share one request, so
+    the respondents x type facets name only series already stored
+    """
+    groups = defaultdict(set)
+    for (respondent, type_code), period in latest.items():
+        groups[period, type_code].add(respondent)
+
+    return [
+        {
+            **SYNC_PARAMS,
+            "facets[respondent][]": sorted(respondents),
+            "facets[type][]": [type_code],
+            "start": (period + timedelta(hours=1)).strftime("%Y-%m-%dT%H"),
+            "offset": 0,
+            "length": SYNC_PAGE_LENGTH,
+        }
+        for (period, type_code), respondents in sorted(groups.items())
+    ]
+
+
+class DeltaSync:
+    """
+    Keeps the stored series current by queueing ingestion jobs for the hours
+    newer than each series' latest period, on demand and, when `interval` is
+    above 0 (SYNC_INTERVAL), every `interval` seconds
+    """
+
+    def __init__(self, jobs: IngestionJobRunner, interval: int):
+        self.jobs = jobs
+        self.interval = interval
+        self.job_ids: list[str] = []
+        self.last_run: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self) -> list[dict]:
+        async with AsyncSessionLocal() as session:
+            latest = await latest_periods(session)
+        jobs = [await self.jobs.submit(params) for params in sync_params(latest)]
+        self.job_ids = [job["job_id"] for job in jobs]
+        self.last_run = datetime.now()
+        logger.info(f"Delta sync of {len(latest)} series queued {len(jobs)} jobs")
+        return jobs
+
+    async def pending(self) -> bool:
+        """
+        Whether jobs of the previous sync are still waiting or running
+        """
+        for job_id in self.job_ids:
+            job = await self.jobs.get(job_id)
+            if job and job["status"] in (
+                IngestionJobStatus.QUEUED,
+                IngestionJobStatus.RUNNING,
+            ):
+                return True
+        return False
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._schedule())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _schedule(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await self.pending():
+                    logger.info("Skipping delta sync, the previous one is running")
+                    continue
+                await self.run()
+            except Exception:
+                logger.exception("Scheduled delta sync failed")
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "scheduled": self._task is not None,
+            "last_run": self.last_run,
+            "job_ids": self.job_ids,
+        }
+
+
+delta_sync = DeltaSync(ingestion_jobs, SYNC_INTERVAL)
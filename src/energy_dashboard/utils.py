@@ -1,25 +1,52 @@
+import os
 from pathlib import Path
+from typing import Optional
 from urllib.parse import urlencode
 
+import httpx
+
 ROOT_DIR = Path(__file__).parent.parent.parent
 TEMPLATES_DIR = f"{Path(__file__).parent}/templates"
 
+# Connection pool settings for the shared EIA HTTP client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+# Root of the EIA API, point it at a local stand-in to develop or benchmark offline
+EIA_BASE_URL = os.getenv("EIA_BASE_URL", "https://api.eia.gov/v2")
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the pooled, keep-alive HTTP client shared by the whole app
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT)
+
 
 class URLBuilder:
-    BASE_URL = "https://api.eia.gov/v2"
+    BASE_URL = EIA_BASE_URL
     ROUTE = "/electricity/rto/region-data/data/"
 
-    def __init__(self):
-        self._url = self.BASE_URL + self.ROUTE
+    def __init__(self, base_url: Optional[str] = None):
+        self._url = (base_url or self.BASE_URL).rstrip("/") + self.ROUTE
         self._params = {}
 
     def add_param(self, key: str, value: str) -> "URLBuilder":
         self._params[key] = value
         return self
 
+    def query_string(self) -> str:
+        # List values repeat the key, as the EIA facet filters expect
+        return urlencode(self._params, doseq=True)
+
     def build(self) -> str:
-        query_string = urlencode(self._params)
-        return f"{self._url}?{query_string}"
+        return f"{self._url}?{self.query_string()}"
 
     def add_api_key(self, key: str) -> "URLBuilder":
         return self.add_param("api_key", key)
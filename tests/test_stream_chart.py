@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+# The app reads its settings when imported
+DATA_DIR = tempfile.mkdtemp()
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{DATA_DIR}/energy.db"
+os.environ["CHART_RENDER_EXECUTOR"] = "thread"
+os.environ["PAGE_CACHE_DIR"] = ""
+os.environ["SYNC_INTERVAL"] = "0"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+import pytest_asyncio  # noqa: E402
+
+from energy_dashboard.routes import app  # noqa: E402
+from energy_dashboard.snapshots import chart_snapshots  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            yield c
+    chart_snapshots.clear()
+
+
+@pytest.mark.asyncio
+async def test_empty_closed_range_in_delta_mode(client):
+    params = {
+        "respondent": "NOPE",
+        "type_name": "Demand",
+        "start_date": "2022-01-01",
+        "end_date": "2022-01-03",
+        "mode": "delta",
+        "pacing": "fixed",
+        "interval": "0",
+    }
+
+    streamed = await client.get("/stream-chart", params=params)
+    assert streamed.status_code == 200
+    assert streamed.text.count("event: Terminate") == 1
+    assert chart_snapshots.stats()["size"] == 1
+
+    cached = await client.get("/stream-chart", params=params)
+    assert cached.status_code == 200
+    assert "etag" in cached.headers
+    assert cached.text.count("event: Terminate") == 1
+    assert "event: chart" not in cached.text
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path, invalid",
+    [
+        ("/stream-chart", {"max_points": "1"}),
+        ("/stream-chart", {"type_name": "Foo"}),
+        ("/stream-chart", {"start_date": "xx"}),
+        ("/api/v1/stats", {"type_name": "Foo"}),
+        ("/api/v1/stats", {"start_date": "xx"}),
+    ],
+)
+async def test_invalid_query_is_unprocessable(client, path, invalid):
+    params = {
+        "respondent": "MISO",
+        "type_name": "Demand",
+        "start_date": "2022-01-01",
+        "end_date": "2022-01-03",
+        **invalid,
+    }
+    response = await client.get(path, params=params)
+    assert response.status_code == 422